@@ -0,0 +1,75 @@
+''' Decode BBC Basic Programs from memory or snapshot dumps, starting at PAGE '''
+import getopt
+import sys
+
+from BBCBasicToText import BASIC2_TABLE, KEYWORDS, Detokenise
+
+BAD_PROGRAM = 5  # A line does not start with a carriage return
+OUT_OF_MEMORY = 6  # PAGE or a line runs off the end of the dump
+
+
+def debug():
+    ''' Show the keyword table, tokens repeated 0x40 higher are shown once '''
+    for index, (text, flags) in enumerate(KEYWORDS, 0x80):
+        if index < 0xC0 and text == KEYWORDS[index - 0x80 + 0x40][0]:
+            print(f"{index:02X} {text.decode()} {KEYWORDS[index - 0x80 + 0x40][0].decode()}")
+            continue
+        print(f"{index:02X} {text.decode():8s} {flags:02X}")
+
+
+def extract_lines(data, page=None):
+    ''' Returns (error number, [(line number, text)]) in one pass over the dump.
+        PAGE is read from &18 in zero page unless given '''
+    data = memoryview(data)
+    end = len(data) - 4
+    lines = []
+    if page is None and len(data) <= 0x18:
+        return OUT_OF_MEMORY, lines
+    addr = data[0x18] << 8 if page is None else page
+    if addr >= end:
+        return OUT_OF_MEMORY, lines
+    while True:
+        if data[addr] != 0x0D:
+            return BAD_PROGRAM, lines
+        if data[addr + 1] & 0x80:
+            return 0, lines  # End of program
+        line_number = (data[addr + 1] << 8) | data[addr + 2]
+        line_length = data[addr + 3]
+        if line_length < 4:
+            return BAD_PROGRAM, lines
+        if addr + line_length > end:
+            return OUT_OF_MEMORY, lines
+        lines.append((line_number, Detokenise(data[addr + 4:addr + line_length], BASIC2_TABLE)))
+        addr += line_length
+
+
+def export_basic(data, filename, page=None):
+    ''' Export basic from a memory dump, the file is only written when there is no error '''
+    error_num, lines = extract_lines(data, page)
+    if error_num == 0:
+        with open(filename, "wb") as file_p:
+            for line_number, text in lines:
+                file_p.write(b"%5d%s\n" % (line_number, text))
+    return error_num
+
+
+def cli():
+    ''' Run from command-line '''
+    optlist, args = getopt.getopt(sys.argv[1:], '', ['page=', 'table'])
+    options = dict(optlist)
+    if '--table' in options:
+        debug()
+        return 0
+    if len(args) != 2:
+        print("Usage: %s [--page=HEX] DUMP OUTPUT | --table" % sys.argv[0])
+        return 1
+    page = int(options['--page'], 16) if '--page' in options else None
+    with open(args[0], 'rb') as file_in:
+        error_num = export_basic(file_in.read(), args[1], page)
+    if error_num:
+        print(f"{args[0]}: {'Bad program' if error_num == BAD_PROGRAM else 'Out of memory'}", file=sys.stderr)
+    return error_num
+
+
+if __name__ == "__main__":
+    sys.exit(cli())
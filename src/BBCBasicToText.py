@@ -12,6 +12,8 @@
 # 4) Handle Tokens in strings
 
 import struct, re, getopt, sys
+from itertools import islice
+import DFSStats
 
 # The list of BBC BASIC V tokens:
 # Base tokens, starting at 0x7f
@@ -58,6 +60,57 @@ stmtTokens= [
     b'WAIT', b'MOUSE', b'QUIT', b'SYS', b'INSTALL', b'LIBRARY', b'TINT', b'ELLIPSE',
     b'BEATS', b'TEMPO', b'VOICES', b'VOICE', b'STEREO', b'OVERLAY']
 
+# BBC Micro BASIC II keywords, starting at 0x80, with the flags the interpreter
+# keeps for each: 0x01 conditional, 0x02 enter middle of statement, 0x04 enter
+# start of statement, 0x08 FN/PROC name follows, 0x10 line number follows,
+# 0x20 rest of line is literal (DATA/REM), 0x40 pseudo-variable (+0x40 at
+# the start of a statement)
+KEYWORDS = [
+    (b'AND', 0x00), (b'DIV', 0x00), (b'EOR', 0x00), (b'MOD', 0x00), # 80
+    (b'OR', 0x00), (b'ERROR', 0x04), (b'LINE', 0x00), (b'OFF', 0x00),
+    (b'STEP', 0x00), (b'SPC', 0x00), (b'TAB(', 0x00), (b'ELSE', 0x14), # 88
+    (b'THEN', 0x14), (b'', 0x00), (b'OPENIN', 0x00), (b'PTR', 0x43),
+    (b'PAGE', 0x43), (b'TIME', 0x43), (b'LOMEM', 0x43), (b'HIMEM', 0x43), # 90
+    (b'ABS', 0x00), (b'ACS', 0x00), (b'ADVAL', 0x00), (b'ASC', 0x00),
+    (b'ASN', 0x00), (b'ATN', 0x00), (b'BGET', 0x01), (b'COS', 0x00), # 98
+    (b'COUNT', 0x01), (b'DEG', 0x00), (b'ERL', 0x01), (b'ERR', 0x01),
+    (b'EVAL', 0x00), (b'EXP', 0x00), (b'EXT', 0x01), (b'FALSE', 0x01), # a0
+    (b'FN', 0x08), (b'GET', 0x00), (b'INKEY', 0x00), (b'INSTR(', 0x00),
+    (b'INT', 0x00), (b'LEN', 0x00), (b'LN', 0x00), (b'LOG', 0x00), # a8
+    (b'NOT', 0x00), (b'OPENUP', 0x00), (b'OPENOUT', 0x00), (b'PI', 0x01),
+    (b'POINT(', 0x00), (b'POS', 0x01), (b'RAD', 0x00), (b'RND', 0x01), # b0
+    (b'SGN', 0x00), (b'SIN', 0x00), (b'SQR', 0x00), (b'TAN', 0x00),
+    (b'TO', 0x00), (b'TRUE', 0x01), (b'USR', 0x00), (b'VAL', 0x00), # b8
+    (b'VPOS', 0x01), (b'CHR$', 0x00), (b'GET$', 0x00), (b'INKEY$', 0x00),
+    (b'LEFT$(', 0x00), (b'MID$(', 0x00), (b'RIGHT$(', 0x00), (b'STR$', 0x00), # c0
+    (b'STRING$(', 0x00), (b'EOF', 0x01), (b'AUTO', 0x10), (b'DELETE', 0x10),
+    (b'LOAD', 0x02), (b'LIST', 0x10), (b'NEW', 0x01), (b'OLD', 0x01), # c8
+    (b'RENUMBER', 0x10), (b'SAVE', 0x02), (b'', 0x00), (b'PTR', 0x00),
+    (b'PAGE', 0x00), (b'TIME', 0x01), (b'LOMEM', 0x00), (b'HIMEM', 0x00), # d0
+    (b'SOUND', 0x02), (b'BPUT', 0x03), (b'CALL', 0x02), (b'CHAIN', 0x02),
+    (b'CLEAR', 0x01), (b'CLOSE', 0x03), (b'CLG', 0x01), (b'CLS', 0x01), # d8
+    (b'DATA', 0x20), (b'DEF', 0x00), (b'DIM', 0x02), (b'DRAW', 0x02),
+    (b'END', 0x01), (b'ENDPROC', 0x01), (b'ENVELOPE', 0x02), (b'FOR', 0x02), # e0
+    (b'GOSUB', 0x12), (b'GOTO', 0x12), (b'GCOL', 0x02), (b'IF', 0x02),
+    (b'INPUT', 0x02), (b'LET', 0x04), (b'LOCAL', 0x02), (b'MODE', 0x02), # e8
+    (b'MOVE', 0x02), (b'NEXT', 0x02), (b'ON', 0x02), (b'VDU', 0x02),
+    (b'PLOT', 0x02), (b'PRINT', 0x02), (b'PROC', 0x0a), (b'READ', 0x02), # f0
+    (b'REM', 0x20), (b'REPEAT', 0x00), (b'REPORT', 0x01), (b'RESTORE', 0x12),
+    (b'RETURN', 0x01), (b'RUN', 0x01), (b'STOP', 0x01), (b'COLOUR', 0x02), # f8
+    (b'TRACE', 0x12), (b'UNTIL', 0x02), (b'WIDTH', 0x02), (b'OSCLI', 0x02)]
+
+# Every byte value mapped to its text, plain characters map to themselves
+TOKEN_TABLE = [bytes([index]) for index in range(0x7f)] + tokens
+BASIC2_TABLE = [bytes([index]) for index in range(0x80)] + [text for text, _flags in KEYWORDS]
+
+# A string, DATA or REM to the end of the line or an encoded line number. The
+# runs between them are looked up in the table a byte at a time. LINES_RE is
+# the same for many lines joined by carriage returns.
+LITERAL_RE = re.compile(rb'("[^"]*"?|[\xdc\xf4][\x00-\xff]*|\x8d[\x00-\xff]{0,3})')
+LINES_RE = re.compile(rb'("[^"\r]*"?|[\xdc\xf4][^\r]*|\x8d[^\r]{0,3})')
+TOKEN_BYTE_RE = re.compile(rb'[\x7f-\xff]')
+CHUNK_LINES = 256 # Lines detokenised together by iter_chunks
+
 def DetokeniseOld(line):
     """Replace all tokens in the line 'line' with their ASCII equivalent."""
     # Internal function used as a callback to the regular expression
@@ -96,59 +149,230 @@ def decode_line_no(data):
     line_number ^= 0x4040
     return bytearray(f"{line_number}", 'utf8')
 
-def Detokenise(line):
-    """Replace all tokens in the line 'line' with their ASCII equivalent."""
-    # Internal function used as a callback to the regular expression
-    # to replace tokens with their ASCII equivalents.
-    
-    detoken = 0
-    index = 0
+def ReplaceLiteral(text, table=TOKEN_TABLE):
+    """Text for one match of LITERAL_RE."""
+    token = text[0]
+    if token == 0x22: # A string is left alone
+        return text
+    if token == 0x8D: # Encoded line number
+        return decode_line_no(text)
+    return table[token] + text[1:] # DATA and REM keep the rest of the line
+
+def Detokenise(line, table=TOKEN_TABLE, literal_re=LITERAL_RE):
+    """Replace all tokens in the line 'line' with their ASCII equivalent,
+       'table' gives the text of each byte, BASIC2_TABLE for a BBC Micro."""
+    parts = literal_re.split(line)
+    lookup = table.__getitem__
+    parts[::2] = [b''.join(map(lookup, run)) if TOKEN_BYTE_RE.search(run) else run for run in parts[::2]]
+    if len(parts) > 1:
+        parts[1::2] = [ReplaceLiteral(text, table) for text in parts[1::2]]
+    return b''.join(parts)
+
+def DetokeniseLines(lines, table=TOKEN_TABLE):
+    """Detokenise a list of lines in one pass over them joined by carriage
+       returns, line by line if one of them holds a carriage return itself."""
+    text = b'\r'.join(lines)
+    if text.count(b'\r') != len(lines) - 1:
+        return [Detokenise(line, table) for line in lines]
+    return Detokenise(text, table, LINES_RE).split(b'\r')
+
+def EncodeLineNumber(number):
+    """The 0x8D token and three bytes decode_line_no() turns back into 'number'."""
+    lo = number & 0xFF
+    hi = number >> 8
+    return bytes([0x8D, (((lo & 0xC0) >> 2) | ((hi & 0xC0) >> 4)) ^ 0x54, (lo & 0x3F) | 0x40, (hi & 0x3F) | 0x40])
+
+def TriePattern(words):
+    """Regular expression for the longest of 'words' found at a position. It is
+       built from a trie of the words, so a character is tested once per level."""
+    trie = {}
+    for word in words:
+        node = trie
+        for char in word:
+            node = node.setdefault(char, {})
+        node[None] = {}
+    def Branches(node):
+        branches = [re.escape(bytes([char])) + Branches(child) for char, child in sorted(node.items(), key=lambda item: -1 if item[0] is None else item[0]) if char is not None]
+        if not branches:
+            return b''
+        pattern = branches[0] if len(branches) == 1 else b'(?:' + b'|'.join(branches) + b')'
+        return b'(?:' + pattern + b')?' if None in node else pattern
+    return Branches(trie)
+
+# Keyword and the spaces after it, a name and whatever follows up to the next
+# capital (it cannot hold a keyword or a line number), number, spaces and
+# punctuation, string, hex number, statement separator, star command
+LEXEME_PATTERN = rb'(%s)( *)|([A-Za-z_`][A-Za-z0-9_`]*[^A-Z"&:*]*)|([0-9]+)|([^A-Za-z_`0-9"&:*]+)|("[^"]*"?)|(&[0-9A-Fa-f]*)|(:)|(\*)'
+NAME_TAIL_RE = re.compile(rb'[A-Za-z_`][A-Za-z0-9_`]*[^A-Z"&:*]*')
+NAME_RE = re.compile(rb'[A-Za-z0-9_`]*')
+LINE_RE = re.compile(rb' *([0-9]+) ?(.*)', re.S)
+TOKENISERS = {}
+
+def Tokeniser(table=TOKEN_TABLE):
+    """(lexeme expression, {keyword: (token, flags)}) for the KEYWORDS that 'table'
+       decodes to the same text, so what is tokenised lists as it was typed."""
+    if id(table) not in TOKENISERS:
+        codes = {}
+        for token, (text, flags) in enumerate(KEYWORDS, 0x80):
+            if text and text not in codes and table[token] == text:
+                if flags & 0x40 and table[token + 0x40] != text:
+                    flags &= ~0x40
+                codes[text] = (token, flags)
+        pattern = TriePattern(sorted(codes))
+        TOKENISERS[id(table)] = (table, re.compile(LEXEME_PATTERN % pattern, re.S), codes)
+    return TOKENISERS[id(table)][1:]
+
+def TokeniseLine(line, lexeme_re, codes):
+    """Tokenise the text of one line, without its line number."""
+    output = bytearray()
+    start = True # Start of a statement, pseudo-variables take their +0x40 form
+    numbers = False # After GOTO, GOSUB, THEN... numbers are line numbers
+    position = 0
     size = len(line)
-    result = bytearray()
-
-    while index < size:
-        data = line[index]
-        if (data >= 0x7F) and (detoken == 0):
-            if data == 0x8D: # Encoded line number
-                result += decode_line_no(line[index:index + 4])
-                index += 4
+    match_at = lexeme_re.match
+    while position < size:
+        match = match_at(line, position)
+        kind = match.lastindex
+        position = match.end()
+        if kind <= 2: # Keyword
+            token, flags = codes[match.group(1)]
+            end = match.end(1)
+            if flags & 0x01 and NAME_RE.match(line, end).end() > end:
+                # Conditional and part of a longer name, so a variable
+                name = NAME_TAIL_RE.match(line, match.start())
+                output += name.group()
+                position = name.end()
+                start = numbers = False
                 continue
-            result += tokens[data - 127]
-            if (data == 0xDC) or (data == 0xF4): # DATA and REM no further detoken
-                detoken |= 2 # To the end of the line
+            if flags & 0x40 and start:
+                token += 0x40
+            output.append(token)
+            if flags & 0x08: # FN or PROC name
+                name = NAME_RE.match(line, end)
+                output += name.group()
+                position = name.end()
+            elif flags & 0x20: # REM and DATA
+                output += line[end:]
+                break
+            else:
+                output += match.group(2)
+            if flags & 0x02:
+                start = False
+            if flags & 0x04:
+                start = True
+            numbers = bool(flags & 0x10)
+        elif kind == 3: # Name
+            output += match.group()
+            start = numbers = False
+        elif kind == 4: # Number
+            text = match.group()
+            if numbers and (text == b'0' or text[0] != 0x30) and int(text) < 0x8000:
+                output += EncodeLineNumber(int(text))
+            else:
+                output += text
+            start = False
+        elif kind == 5: # Spaces and commas keep line numbers going
+            text = match.group()
+            output += text
+            if numbers and text.strip(b' ,'):
+                numbers = False
+        elif kind == 9 and start: # * command
+            output += line[position - 1:]
+            break
         else:
-            result += bytearray([data])
-        if data == ord('"'):
-            detoken ^= 1 # Until the next "
-        index += 1
+            output += match.group()
+            numbers = False
+            if kind == 8:
+                start = True
+    return output
 
-    return result
+def Tokenise(text, table=TOKEN_TABLE):
+    """Tokenise a program listing, one numbered line per CR or LF. 'table' is
+       the one the program will be decoded with."""
+    lexeme_re, codes = Tokeniser(table)
+    if b'\r' in text:
+        lines = text.replace(b'\r\n', b'\r').split(b'\r')
+    else:
+        lines = text.split(b'\n')
+    program = bytearray()
+    for line in lines:
+        if not line.strip():
+            continue
+        match = LINE_RE.match(line)
+        if not match:
+            raise Exception("Bad program - No line number")
+        lineNumber = int(match.group(1))
+        tokens = TokeniseLine(match.group(2), lexeme_re, codes)
+        if lineNumber > 0x7fff or len(tokens) > 251:
+            raise Exception("Bad program - Line %d" % lineNumber)
+        program += struct.pack('>BHB', 13, lineNumber, len(tokens) + 4) + tokens
+    return bytes(program + b'\r\xff')
+
+@DFSStats.timed('Encode')
+def Encode(text, output, table=TOKEN_TABLE):
+    """Tokenise the listing 'text' and write the program to 'output'."""
+    output.write(Tokenise(text, table))
+
+def ReadHeaders(buffer):
+    """Yields (line number, tokenised line) from a buffer or a file like object."""
+    if hasattr(buffer, 'read'):
+        while True:
+            header = buffer.read(2)
+            if len(header) < 2 or header[0] != 13: #'\r':
+                raise Exception("Bad program")
+            if header[1] == 0xff:
+                return
+            header += buffer.read(2)
+            if len(header) < 4 or header[3] == 0:
+                raise Exception("Bad program")
+            lineNumber, length = struct.unpack_from('>hB', header, 1)
+            yield lineNumber, buffer.read(length - 4) if length > 4 else b''
+    data = memoryview(buffer)
+    size = len(data)
+    offset = 0
+    while True:
+        if size - offset < 2:
+            raise Exception("Bad program")
+        if data[offset] != 13: #'\r':
+            raise Exception("Bad program")
+        if data[offset + 1] == 0xff:
+            return
+        lineNumber, length = struct.unpack_from('>hB', data, offset + 1)
+        if length == 0:
+            raise Exception("Bad program")
+        yield lineNumber, data[offset + 4:offset + length]
+        offset += length
 
 def ReadLines(data):
     """Returns a list of [line number, tokenised line] from a binary
        BBC BASIC V format file."""
-    lines = []
+    return [[lineNumber, lineData] for lineNumber, lineData in ReadHeaders(data)]
+
+def iter_chunks(buffer, size=CHUNK_LINES):
+    """Yields lists of up to 'size' (line number, detokenised text) from a
+       buffer or a file like object, each list detokenised in one pass."""
+    headers = ReadHeaders(buffer)
     while True:
-        if len(data) < 2:
-            raise Exception("Bad program")
-        if data[0] != 13: #'\r':
-            print(data)
-            raise Exception("Bad program")
-        if data[1] == 0xff:
-            break
-        lineNumber, length = struct.unpack('>hB', data[1:4])
-        lineData = data[4:length]
-        lines.append([lineNumber, lineData])
-        data = data[length:]
-    return lines
+        chunk = list(islice(headers, size))
+        if not chunk:
+            return
+        yield list(zip([lineNumber for lineNumber, _line in chunk],
+                       DetokeniseLines([line for _lineNumber, line in chunk])))
 
+def iter_lines(buffer):
+    """Yields (line number, detokenised text) one line at a time from a
+       buffer or a file like object."""
+    for chunk in iter_chunks(buffer):
+        yield from chunk
+
+@DFSStats.timed('Decode')
 def Decode(data, output, use_line_numbers=True):
     """Decode binary data 'data' and write the result to 'output'."""
-    lines = ReadLines(data)
-    for lineNumber, line in lines:
-        lineData = bytes(f"{lineNumber} ", encoding='utf8') if use_line_numbers else bytes()
-        lineData += Detokenise(line)
-        output.write(lineData + bytearray([13]))
+    for chunk in iter_chunks(data):
+        if use_line_numbers:
+            output.write(b''.join([b"%d %s\r" % line for line in chunk]))
+        else:
+            output.write(b''.join([text + b"\r" for _lineNumber, text in chunk]))
 
 def test():
     ''' Quick Test '''
@@ -159,14 +383,20 @@ def test():
 
 def cli():
     ''' Run from command-line '''    
-    _optlist, args = getopt.getopt(sys.argv[1:], '')
+    optlist, args = getopt.getopt(sys.argv[1:], '', ['stats', 'tokenise'])
     if len(args) != 2:
-        print("Usage: %s INPUT OUTPUT" % sys.argv[0])
+        print("Usage: %s [--stats] [--tokenise] INPUT OUTPUT" % sys.argv[0])
         sys.exit(1)
+    stats = DFSStats.enable() if ('--stats', '') in optlist else None
     with open(args[0], 'rb') as file_in:
         entireFile = file_in.read()
         with open(args[1], 'wb') as file_out:
-            Decode(entireFile, file_out)
+            if ('--tokenise', '') in optlist:
+                Encode(entireFile, file_out)
+            else:
+                Decode(entireFile, file_out)
+    if stats:
+        print(stats.report(), file=sys.stderr)
 
 if __name__ == "__main__":
     #test()
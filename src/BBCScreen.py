@@ -0,0 +1,64 @@
+''' Render BBC Micro screen memory to PPM images '''
+
+# Pixels across, bits per pixel and bytes per character row of each mode
+MODES = {
+    0: (640, 1, 640),
+    1: (320, 2, 640),
+    2: (160, 4, 640),
+    4: (320, 1, 320),
+    5: (160, 2, 320),
+}
+WIDTH = 640  # Every mode is stretched to 640 pixels across
+ROWS = 32  # Character rows of 8 lines
+
+BLACK, RED, GREEN, YELLOW = b'\x00\x00\x00', b'\xff\x00\x00', b'\x00\xff\x00', b'\xff\xff\x00'
+BLUE, MAGENTA, CYAN, WHITE = b'\x00\x00\xff', b'\xff\x00\xff', b'\x00\xff\xff', b'\xff\xff\xff'
+COLOURS = [BLACK, RED, GREEN, YELLOW, BLUE, MAGENTA, CYAN, WHITE]
+
+# Default palettes, the flashing colours 8-15 are shown in their first colour
+PALETTES = {
+    1: [BLACK, WHITE],
+    2: [BLACK, RED, YELLOW, WHITE],
+    4: COLOURS + COLOURS,
+}
+
+
+def pixels(value, bits):
+    ''' Logical colours of the pixels held in one screen byte '''
+    if bits == 1:
+        return [(value >> (7 - pixel)) & 1 for pixel in range(8)]
+    if bits == 2:
+        return [((value >> (7 - pixel)) & 1) << 1 | ((value >> (3 - pixel)) & 1) for pixel in range(4)]
+    return [
+        ((value >> (7 - pixel)) & 1) << 3 | ((value >> (5 - pixel)) & 1) << 2
+        | ((value >> (3 - pixel)) & 1) << 1 | ((value >> (1 - pixel)) & 1)
+        for pixel in range(2)
+    ]
+
+
+def byte_table(mode, palette=None):
+    ''' RGB pixels, stretched to 640 across, for each of the 256 byte values '''
+    width, bits, _row_bytes = MODES[mode]
+    palette = palette or PALETTES[bits]
+    stretch = WIDTH // width
+    return [b''.join(palette[colour] * stretch for colour in pixels(value, bits)) for value in range(256)]
+
+
+TABLES = {}
+
+
+def render_ppm(data, mode=0, palette=None):
+    ''' Binary PPM of a screen dump laid out in 8 line character cells '''
+    _width, _bits, row_bytes = MODES[mode]
+    if palette:
+        table = byte_table(mode, palette)
+    else:
+        table = TABLES.get(mode) or TABLES.setdefault(mode, byte_table(mode))
+    data = bytes(data)
+    rows = min(-(-len(data) // row_bytes), ROWS)
+    data = data[:rows * row_bytes].ljust(rows * row_bytes, b'\x00')
+    # Gather each pixel line, byte n of a character row is line n % 8 of column n // 8
+    lines = b''.join(
+        data[base + line:base + row_bytes:8] for base in range(0, rows * row_bytes, row_bytes) for line in range(8)
+    )
+    return b'P6 %d %d 255\n' % (WIDTH, rows * 8) + b''.join(map(table.__getitem__, lines))
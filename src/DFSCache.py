@@ -0,0 +1,99 @@
+''' On-disk cache of raw catalogues and file hashes '''
+import os
+import sqlite3
+import zlib
+
+import DFSStats
+from PyAcornDFS import read_surface
+from DFSHash import hash_index
+
+CATALOGUE_SIZE = 0x200
+
+
+class catalogue_cache:
+    ''' SQLite cache keyed on image path, size, mtime and catalogue checksums.
+        The two catalogue sectors of each disk are kept as they are on the disk,
+        file hashes are kept in a DFSHash.hash_index in the same database '''
+
+    def __init__(self, filename):
+        self.filename = filename
+        self.indexes = {}
+        self.db = sqlite3.connect(filename, check_same_thread=False)
+        self.db.executescript(
+            '''
+            CREATE TABLE IF NOT EXISTS catalogue_images (
+                image TEXT PRIMARY KEY, size INTEGER, mtime INTEGER);
+            CREATE TABLE IF NOT EXISTS catalogues (
+                image TEXT, din INTEGER, crc INTEGER, catalogue BLOB,
+                PRIMARY KEY (image, din));
+            '''
+        )
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_args):
+        self.close()
+
+    def close(self):
+        ''' Close the cache database '''
+        for index in self.indexes.values():
+            index.close()
+        self.indexes = {}
+        self.db.close()
+
+    def read_catalogues(self, path):
+        ''' Cached {din: (crc, raw catalogue)} for an image '''
+        return {
+            din: (crc, catalogue)
+            for din, crc, catalogue in self.db.execute(
+                'SELECT din, crc, catalogue FROM catalogues WHERE image = ?', (path,)
+            )
+        }
+
+    def is_unchanged(self, path, stat):
+        ''' Is the image the same size and age as when it was cached '''
+        return self.db.execute(
+            'SELECT size, mtime FROM catalogue_images WHERE image = ?', (path,)
+        ).fetchone() == (stat.st_size, stat.st_mtime_ns)
+
+    @DFSStats.timed('cache_load')
+    def load(self, image):
+        ''' Give an acorn_dfs the raw catalogues of every disk, only changed disks are stored again '''
+        disks = image.disk_info
+        path = os.path.abspath(image.filename)
+        stat = os.stat(path)
+        cached = self.read_catalogues(path)
+        stats = DFSStats.STATS
+        if self.is_unchanged(path, stat) and len(cached) == len(disks):
+            raw = [cached[din][1] for din in range(len(disks))]
+            if stats is not None:
+                for _din in cached:
+                    stats.cache(True, 'database')
+        else:
+            raw = []
+            changed = []
+            for din, offset in enumerate(disks.offsets):
+                catalogue = bytes(read_surface(image.view, offset, CATALOGUE_SIZE)).ljust(CATALOGUE_SIZE, b'\x00')
+                crc = zlib.crc32(catalogue)
+                hit = din in cached and cached[din][0] == crc
+                if stats is not None:
+                    stats.cache(hit, 'database')
+                if not hit:
+                    changed.append((path, din, crc, catalogue))
+                raw.append(catalogue)
+            with self.db:
+                self.db.execute('DELETE FROM catalogues WHERE image = ? AND din >= ?', (path, len(disks)))
+                self.db.executemany('INSERT OR REPLACE INTO catalogues VALUES (?, ?, ?, ?)', changed)
+                self.db.execute(
+                    'INSERT OR REPLACE INTO catalogue_images VALUES (?, ?, ?)', (path, stat.st_size, stat.st_mtime_ns)
+                )
+        disks.raw = raw  # Decoded when used, so catalogues the LRU drops cost no read of the image
+
+    def hashes(self, image, algorithm='md5'):
+        ''' {(din, file): digest} for every file, hashed once per image version '''
+        if algorithm not in self.indexes:
+            self.indexes[algorithm] = hash_index(self.filename, algorithm)
+        index = self.indexes[algorithm]
+        index.add_image(image.filename, image=image)
+        return index.digests(image.filename)
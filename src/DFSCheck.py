@@ -0,0 +1,107 @@
+''' Check and repair DFS catalogues, a disk at a time or over whole collections '''
+from concurrent.futures import ProcessPoolExecutor
+
+from PyAcornDFS import acorn_dfs, from_acorn
+
+
+def sectors(info):
+    ''' Number of sectors a file uses '''
+    return (info['size'] + 255) >> 8
+
+
+def check_disk(disk, din=0):
+    ''' Problems with one catalogue as (din, file index, code, message) '''
+    problems = []
+    if (disk['cycle'] & 0x0F) > 9 or (disk['cycle'] >> 4) > 9:
+        problems.append((din, None, 'cycle', f"Cycle number &{disk['cycle']:02X} is not BCD"))
+    names = {}
+    extents = []
+    for file_index, info in enumerate(disk['file_info']):
+        try:
+            from_acorn(info.raw_name)
+        except UnicodeDecodeError:
+            problems.append((din, file_index, 'name', "Name can not be decoded"))
+        key = (info['ext'].upper(), info['name'].upper())
+        if key in names:
+            problems.append((din, file_index, 'duplicate', f"Same name as file {names[key]}"))
+        names.setdefault(key, file_index)
+        if info['start'] < 2:
+            problems.append((din, file_index, 'start', f"Starts in the catalogue at sector {info['start']}"))
+        elif info['start'] + sectors(info) > disk['sector_count']:
+            problems.append((din, file_index, 'bounds',
+                             f"Sectors &{info['start']:03X}-&{info['start'] + sectors(info) - 1:03X} "
+                             f"run past the end of the disk"))
+        if sectors(info):
+            extents.append((info['start'], info['start'] + sectors(info), file_index))
+    # Sort and sweep, each file only has to be compared with the furthest end so far
+    extents.sort()
+    end, owner = 2, None
+    for start, stop, file_index in extents:
+        if start < end and owner is not None:
+            problems.append((din, file_index, 'overlap', f"Overlaps file {owner}"))
+        elif start > end:
+            problems.append((din, None, 'orphan', f"Sectors &{end:03X}-&{start - 1:03X} are not used"))
+        if stop > end:
+            end, owner = stop, file_index
+    return problems
+
+
+def check_image(filename, repair=False, compact=False):
+    ''' Problems with every disk of an image, repaired if asked '''
+    problems = []
+    with acorn_dfs(filename, writable=repair) as image:
+        disks = image.disk_info
+        for din, disk in enumerate(disks):
+            if disk is None:
+                if not disks.header or disks.header[din]['status'] in ('locked', 'unlocked'):
+                    problems.append((din, None, 'catalogue', "Catalogue is not valid"))
+                continue
+            problems.extend(check_disk(disk, din))
+            for file_index, info in enumerate(disk['file_info']):
+                data, _name = image.get_data(din, file_index)
+                # get_data stops at the end of the disk, which check_disk has reported
+                if len(data) < min(info['size'], max(disk['sector_count'] - info['start'], 0) * 256):
+                    problems.append((din, file_index, 'short', "File runs past the end of the image"))
+        if repair and problems:
+            with image.batch():
+                for din in sorted({problem[0] for problem in problems}):
+                    repair_disk(image, din, [problem for problem in problems if problem[0] == din], compact)
+    return problems
+
+
+def repair_disk(image, din, problems, compact=False):
+    ''' Fix the problems check_disk found with a disk '''
+    disk = image.disk_info[din]
+    if disk is None:
+        return
+    codes = {problem[2] for problem in problems}
+    if 'cycle' in codes:
+        catalogue = bytearray(image.read_disk(din, 0x100, 0x100))
+        catalogue[4] = 0
+        image.write_disk(din, 0x100, catalogue)
+    entries = image.get_entries(din)
+    keep = []
+    for entry in sorted(entries, key=lambda entry: entry[5]):
+        name, ext, load, exe, size, start = entry
+        if start < 2 or start >= disk['sector_count']:
+            continue  # Nothing can be saved
+        size = min(size, (disk['sector_count'] - start) * 256)
+        if keep and keep[-1][5] + ((keep[-1][4] + 255) >> 8) > start:
+            keep[-1][4] = (start - keep[-1][5]) * 256  # Cut the earlier file short
+        keep.append([name, ext, load, exe, size, start])
+    if keep != sorted(entries, key=lambda entry: entry[5]) or 'cycle' in codes:
+        image.write_catalogue(din, keep)
+    if compact and 'orphan' in codes:
+        image.compact(din)
+
+
+def check_images(filenames, repair=False, compact=False, workers=None):
+    ''' Check many images in parallel, yields (filename, problems) in order '''
+    if workers == 1 or len(filenames) == 1:
+        for filename in filenames:
+            yield filename, check_image(filename, repair, compact)
+        return
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        jobs = [pool.submit(check_image, filename, repair, compact) for filename in filenames]
+        for filename, job in zip(filenames, jobs):
+            yield filename, job.result()
@@ -0,0 +1,127 @@
+''' Hash every file of DFS images, keep a persistent index and find duplicates '''
+import hashlib
+import os
+import sqlite3
+import zlib
+from contextlib import nullcontext
+
+from PyAcornDFS import acorn_dfs
+
+try:
+    import xxhash
+except ImportError:
+    xxhash = None
+
+FAST_ALGORITHMS = ('crc32', 'adler32', 'xxh64', 'xxh3_64', 'xxh3_128')
+DEFAULT_INDEX = os.path.join(os.path.expanduser('~'), '.pyacorndfs.db')  # Shared with the GUI's catalogue cache
+
+
+def get_hasher(algorithm='md5'):
+    ''' Function returning the upper case hex digest of some data '''
+    if algorithm == 'crc32':
+        return lambda data: f"{zlib.crc32(data):08X}"
+    if algorithm == 'adler32':
+        return lambda data: f"{zlib.adler32(data):08X}"
+    if algorithm.startswith('xxh'):
+        if xxhash is None:
+            raise ValueError(f"{algorithm} needs the xxhash package")
+        function = getattr(xxhash, algorithm)
+        return lambda data: function(data).hexdigest().upper()
+    hashlib.new(algorithm)  # Raises ValueError for an unknown algorithm
+    return lambda data: hashlib.new(algorithm, data).hexdigest().upper()
+
+
+def hash_files(image, algorithm='md5'):
+    ''' Yield (disk, file, file_record, digest) for every file in one pass '''
+    hasher = get_hasher(algorithm)
+    for din, file_index, info in image.disk_info.file_table():
+        data, _name = image.get_data(din, file_index)
+        yield din, file_index, info, hasher(data)
+
+
+class hash_index:
+    ''' Persistent (image, din, file) -> hash, size, load, exec index '''
+
+    def __init__(self, filename=':memory:', algorithm='md5'):
+        self.algorithm = algorithm
+        self.db = sqlite3.connect(filename)
+        self.db.executescript(
+            '''
+            CREATE TABLE IF NOT EXISTS images (
+                image TEXT, algorithm TEXT, size INTEGER, mtime INTEGER,
+                PRIMARY KEY (image, algorithm));
+            CREATE TABLE IF NOT EXISTS files (
+                image TEXT, algorithm TEXT, din INTEGER, file INTEGER, name TEXT,
+                hash TEXT, size INTEGER, load INTEGER, exec INTEGER,
+                PRIMARY KEY (image, algorithm, din, file));
+            CREATE INDEX IF NOT EXISTS files_hash ON files (algorithm, hash);
+            '''
+        )
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_args):
+        self.close()
+
+    def close(self):
+        ''' Close the index database '''
+        self.db.close()
+
+    def add_image(self, filename, force=False, image=None):
+        ''' Hash an image unless it is unchanged since last time, returns files hashed.
+            An acorn_dfs already open on the image can be given to save mapping it again '''
+        filename = os.path.abspath(filename)
+        stat = os.stat(filename)
+        row = self.db.execute(
+            'SELECT size, mtime FROM images WHERE image = ? AND algorithm = ?',
+            (filename, self.algorithm),
+        ).fetchone()
+        if row == (stat.st_size, stat.st_mtime_ns) and not force:
+            return 0
+        with nullcontext(image) if image is not None else acorn_dfs(filename) as image:
+            rows = [
+                (filename, self.algorithm, din, file_index, f"{info['ext']}.{info['name']}",
+                 digest, info['size'], info['load_&'], info['exec_&'])
+                for din, file_index, info, digest in hash_files(image, self.algorithm)
+            ]
+        with self.db:
+            self.db.execute(
+                'DELETE FROM files WHERE image = ? AND algorithm = ?', (filename, self.algorithm)
+            )
+            self.db.executemany('INSERT INTO files VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)', rows)
+            self.db.execute(
+                'INSERT OR REPLACE INTO images VALUES (?, ?, ?, ?)',
+                (filename, self.algorithm, stat.st_size, stat.st_mtime_ns),
+            )
+        return len(rows)
+
+    def lookup(self, filename, din, file_index):
+        ''' Return (hash, size, load, exec) of one file, None if not indexed '''
+        return self.db.execute(
+            'SELECT hash, size, load, exec FROM files '
+            'WHERE image = ? AND algorithm = ? AND din = ? AND file = ?',
+            (os.path.abspath(filename), self.algorithm, din, file_index),
+        ).fetchone()
+
+    def digests(self, filename):
+        ''' {(din, file): hash} of every file indexed for an image '''
+        return {
+            (din, file_index): digest
+            for din, file_index, digest in self.db.execute(
+                'SELECT din, file, hash FROM files WHERE image = ? AND algorithm = ?',
+                (os.path.abspath(filename), self.algorithm),
+            )
+        }
+
+    def duplicates(self):
+        ''' List of (hash, size, [(image, din, file, name), ...]) for files held more than once '''
+        groups = {}
+        for digest, size, image, din, file_index, name in self.db.execute(
+            'SELECT hash, size, image, din, file, name FROM files '
+            'WHERE algorithm = ? AND hash IN (SELECT hash FROM files WHERE algorithm = ? '
+            'GROUP BY hash HAVING COUNT(*) > 1) ORDER BY hash, image, din, file',
+            (self.algorithm, self.algorithm),
+        ):
+            groups.setdefault((digest, size), []).append((image, din, file_index, name))
+        return [(digest, size, copies) for (digest, size), copies in groups.items()]
@@ -0,0 +1,146 @@
+''' Query the catalogues of many DFS images through an in-memory index '''
+import re
+from array import array
+from bisect import bisect_left, bisect_right
+from fnmatch import fnmatchcase
+
+from PyAcornDFS import acorn_dfs
+from DFSHash import hash_files
+
+COLUMNS = ('image', 'din', 'file', 'ext', 'name', 'load', 'exec', 'size', 'start', 'locked', 'hash')
+RANGES = ('load', 'exec', 'size', 'start')
+ADDRESSES = ('load', 'exec')
+WILDCARDS = re.compile(r'[*?\[]')
+
+
+def parse_range(text):
+    ''' "&FF00", "&1000-&1FFF", "-&100" or "4096-" as an inclusive (low, high) '''
+
+    def number(value, default):
+        value = value.strip()
+        if not value:
+            return default
+        if value[0] in '&$':
+            return int(value[1:], 16)
+        return int(value, 0)
+
+    low, sep, high = text.partition('-')
+    if not sep:
+        low = high = number(low, None)
+        return low, high
+    return number(low, 0), number(high, 0xFFFFFFFF)
+
+
+def host_address(value):
+    ''' Load and exec addresses with the DFS high bits set are indexed as &FFFFxxxx, so &FFxxxx is one too '''
+    if 0xFF0000 <= value <= 0xFFFFFF:
+        return value | 0xFFFF0000
+    return value
+
+
+class file_index:
+    ''' Column arrays of every file, sorted indexes on the numbers and an inverted index on name '''
+
+    def __init__(self, algorithm=None, cache=None):
+        self.algorithm = algorithm
+        self.cache = cache
+        self.images = []
+        self.columns = {
+            'image': array('L'), 'din': array('L'), 'file': array('B'),
+            'ext': [], 'name': [], 'load': array('L'), 'exec': array('L'),
+            'size': array('L'), 'start': array('L'), 'locked': bytearray(), 'hash': [],
+        }
+        self.names = {}  # Upper case name -> rows
+        self.hashes = {}  # Digest -> rows
+        self.sorted = None
+
+    def __len__(self):
+        return len(self.columns['din'])
+
+    def add_image(self, filename):
+        ''' Index every file of one image '''
+        columns = self.columns
+        with acorn_dfs(filename, self.cache) as image:
+            if self.algorithm is None:
+                digests = {}
+            elif self.cache:
+                digests = self.cache.hashes(image, self.algorithm)
+            else:
+                digests = {(din, index): digest for din, index, _info, digest in hash_files(image, self.algorithm)}
+            image_index = len(self.images)
+            self.images.append(filename)
+            for din, file_index, info in image.disk_info.file_table():
+                row = len(columns['din'])
+                name = info.name.upper()
+                digest = digests.get((din, file_index))
+                columns['image'].append(image_index)
+                columns['din'].append(din)
+                columns['file'].append(file_index)
+                columns['ext'].append(info.ext.upper())
+                columns['name'].append(name)
+                columns['load'].append(info.load_addr)
+                columns['exec'].append(info.exec_addr)
+                columns['size'].append(info.size)
+                columns['start'].append(info.start)
+                columns['locked'].append(info.raw_ext >> 7)
+                columns['hash'].append(digest)
+                self.names.setdefault(name, []).append(row)
+                if digest:
+                    self.hashes.setdefault(digest.upper(), []).append(row)
+        self.sorted = None
+
+    def build(self):
+        ''' Sort the numeric columns and the names, done once after the images are added '''
+        if self.sorted is None:
+            self.sorted = {}
+            for column in RANGES:
+                values = self.columns[column]
+                rows = sorted(range(len(values)), key=values.__getitem__)
+                self.sorted[column] = ([values[row] for row in rows], rows)
+            self.sorted['name'] = sorted(self.names)
+        return self.sorted
+
+    def match_name(self, pattern):
+        ''' Rows whose name matches a glob, only names sharing its literal prefix are tried '''
+        pattern = pattern.upper()
+        wildcard = WILDCARDS.search(pattern)
+        if not wildcard:
+            return set(self.names.get(pattern, ()))
+        prefix = pattern[:wildcard.start()]
+        names = self.build()['name']
+        first = bisect_left(names, prefix)
+        last = bisect_left(names, prefix + '\uffff') if prefix else len(names)
+        return {row for name in names[first:last] if fnmatchcase(name, pattern) for row in self.names[name]}
+
+    def match_range(self, column, low, high):
+        ''' Rows whose column lies between low and high inclusive '''
+        values, rows = self.build()[column]
+        return set(rows[bisect_left(values, low):bisect_right(values, high)])
+
+    def query(self, name=None, ext=None, load=None, exec_addr=None, size=None, start=None, locked=None, digest=None):
+        ''' Sorted rows matching every filter given, ranges are (low, high) inclusive '''
+        found = []
+        if digest is not None:
+            found.append(set(self.hashes.get(digest.upper(), ())))
+        if name is not None:
+            found.append(self.match_name(name))
+        for column, bounds in zip(RANGES, (load, exec_addr, size, start)):
+            if bounds is not None:
+                if column in ADDRESSES:
+                    bounds = map(host_address, bounds)
+                found.append(self.match_range(column, *bounds))
+        found.sort(key=len)
+        rows = set.intersection(*found) if found else range(len(self))
+        if ext is not None:
+            ext = ext.upper()
+            rows = [row for row in rows if self.columns['ext'][row] == ext]
+        if locked is not None:
+            rows = [row for row in rows if self.columns['locked'][row] == locked]
+        return sorted(rows)
+
+    def record(self, row):
+        ''' One row as a dict of COLUMNS '''
+        result = {column: self.columns[column][row] for column in COLUMNS}
+        result['image'] = self.images[result['image']]
+        result['locked'] = bool(result['locked'])
+        return result
@@ -0,0 +1,276 @@
+''' Serve the catalogues, files and disks of a mapped image over HTTP with asyncio
+
+    GET /                 the disks of the image as JSON
+    GET /<din>            the catalogue of a disk as JSON
+    GET /<din>.ssd        the whole disk as an SSD
+    GET /<din>/<file>     one file, by index or as ext.name e.g. /0/$.!BOOT
+
+Disks and files honour a single Range: bytes=first-last header.
+'''
+import argparse
+import asyncio
+import json
+import re
+import sys
+from urllib.parse import unquote
+
+from PyAcornDFS import acorn_dfs, read_sectors, surface_size
+
+CHUNK = 0x10000  # Bytes written before waiting for the client to drain
+REASONS = {200: 'OK', 206: 'Partial Content', 400: 'Bad Request', 404: 'Not Found',
+           405: 'Method Not Allowed', 416: 'Range Not Satisfiable', 500: 'Internal Server Error'}
+RANGE_RE = re.compile(r'bytes=(\d*)-(\d*)$')
+PATH_RE = re.compile(r'/(\d+)(\.ssd|/(.+))?$')
+
+
+class HTTPError(Exception):
+    ''' An error status to send to the client '''
+
+    def __init__(self, status, message='', headers=None):
+        super().__init__(message or REASONS[status])
+        self.status = status
+        self.headers = headers or {}
+
+
+def parse_range(header, size):
+    ''' (first, last) inclusive from a Range header, None for the whole body '''
+    if not header:
+        return None
+    match = RANGE_RE.match(header.strip())
+    if not match or match.groups() == ('', ''):
+        return None  # Several ranges or another unit, send everything
+    first, last = match.groups()
+    if first == '':
+        first, last = max(size - int(last), 0), size - 1
+    else:
+        first = int(first)
+        last = min(int(last), size - 1) if last else size - 1
+    if first > last or first >= size:
+        raise HTTPError(416, headers={'Content-Range': f"bytes */{size}"})
+    return first, last
+
+
+class dfs_server:
+    ''' One shared read only mapping, catalogues kept in a bounded LRU '''
+
+    def __init__(self, filename, catalogues=64):
+        self.image = acorn_dfs(filename, catalogues=catalogues)
+        if not self.image.disk_info:
+            raise ValueError(f"{filename} is not a DFS image")
+
+    def close(self):
+        self.image.close()
+
+    def get_disk(self, din):
+        ''' Catalogue of a formatted disk '''
+        disk_info = self.image.disk_info
+        disk = disk_info[din] if 0 <= din < len(disk_info) else None
+        if not disk:
+            raise HTTPError(404, f"No disk {din}")
+        return disk
+
+    def list_disks(self):
+        ''' Titles come from the MMB header when there is one, no catalogue is read '''
+        disk_info = self.image.disk_info
+        disks = []
+        for din in range(len(disk_info)):
+            if disk_info.header:
+                entry = disk_info.header[din]
+                if entry['status'] in ('unformatted', 'invalid'):
+                    continue
+                disks.append({'din': din, 'title': entry['title'], 'status': entry['status']})
+            elif disk_info[din]:
+                disks.append({'din': din, 'title': disk_info[din]['title'], 'status': None})
+        return {'image': self.image.filename, 'disks': disks}
+
+    def list_files(self, din):
+        disk = self.get_disk(din)
+        return {
+            'din': din, 'title': disk['title'], 'cycle': disk['cycle'], 'boot': disk['boot'],
+            'sectors': disk['sector_count'],
+            'files': [
+                {'file': index, 'ext': info.ext, 'name': info.name, 'locked': info.lock == 'L',
+                 'load': info.load_addr, 'exec': info.exec_addr, 'size': info.size, 'start': info.start}
+                for index, info in enumerate(disk['file_info'])
+            ],
+        }
+
+    def find_file(self, din, name):
+        ''' file_record by index or ext.name, a bare name is in $ '''
+        file_info = self.get_disk(din)['file_info']
+        if name.isdigit():
+            if int(name) < len(file_info):
+                return file_info[int(name)]
+        else:
+            if '.' not in name[1:2]:
+                name = '$.' + name
+            for info in file_info:
+                if f"{info.ext}.{info.name}".upper() == name.upper():
+                    return info
+        raise HTTPError(404, f"No file {name} on disk {din}")
+
+    def resolve(self, path):
+        ''' (JSON, None) or (None, (disk base, position, size, content type)) for a path '''
+        path = unquote(path.split('?', 1)[0])
+        if path == '/':
+            return self.list_disks(), None
+        match = PATH_RE.match(path)
+        if not match:
+            raise HTTPError(404)
+        din = int(match.group(1))
+        if match.group(2) is None:
+            return self.list_files(din), None
+        disk = self.get_disk(din)
+        available = surface_size(self.image.view, disk.offset, self.image.disk_info.interleave)
+        if match.group(2) == '.ssd':
+            return None, (disk.offset, 0, available, 'application/x-ssd')
+        info = self.find_file(din, match.group(3))
+        # As get_data, stop at the end of the disk, and at the end of a short image
+        size = min(info.size, (disk.sector_count - info.start) * 256, available - info.start * 256)
+        return None, (disk.offset, info.start * 256, max(size, 0), 'application/octet-stream')
+
+    async def send_range(self, writer, base, position, size):
+        ''' Copy part of a disk surface to the client straight from the mapping '''
+        interleave = self.image.disk_info.interleave
+        while size > 0:
+            length = min(size, CHUNK)
+            writer.write(read_sectors(self.image.view, base, position, length, interleave))
+            await writer.drain()
+            position += length
+            size -= length
+
+    async def respond(self, writer, method, path, headers):
+        ''' Answer one request, returns the status '''
+        if method not in ('GET', 'HEAD'):
+            raise HTTPError(405)
+        document, surface = self.resolve(path)
+        if document is not None:
+            body = json.dumps(document).encode('utf-8')
+            write_head(writer, 200, {'Content-Type': 'application/json', 'Content-Length': len(body)})
+            if method == 'GET':
+                writer.write(body)
+            return 200
+        base, position, size, content_type = surface
+        reply = {'Content-Type': content_type, 'Accept-Ranges': 'bytes'}
+        status = 200
+        part = parse_range(headers.get('range'), size)
+        if part:
+            status = 206
+            reply['Content-Range'] = f"bytes {part[0]}-{part[1]}/{size}"
+            position, size = position + part[0], part[1] - part[0] + 1
+        reply['Content-Length'] = size
+        write_head(writer, status, reply)
+        if method == 'GET':
+            await self.send_range(writer, base, position, size)
+        return status
+
+    async def handle(self, reader, writer):
+        ''' One connection, requests are answered in turn while it is kept alive '''
+        try:
+            while True:
+                request = await read_head(reader)
+                if request is None:
+                    break
+                method, path, version, headers = request
+                try:
+                    await self.respond(writer, method, path, headers)
+                except HTTPError as error:
+                    write_error(writer, method, error)
+                except (ConnectionError, asyncio.CancelledError):
+                    raise
+                except Exception as error:
+                    write_error(writer, method, HTTPError(500, str(error)))
+                await writer.drain()
+                connection = headers.get('connection', '').lower()
+                if connection == 'close' or (version == 'HTTP/1.0' and connection != 'keep-alive'):
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass  # The client went away or sent rubbish
+        finally:
+            writer.close()
+
+    async def serve(self, host='127.0.0.1', port=8080):
+        ''' Start listening, returns the asyncio server '''
+        return await asyncio.start_server(self.handle, host, port)
+
+
+async def read_head(reader):
+    ''' (method, path, version, headers) of the next request, None at the end of the connection '''
+    line = await reader.readline()
+    if not line.strip():
+        return None
+    method, path, version = line.decode('latin-1').split()
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if not line.strip():
+            break
+        name, _sep, value = line.decode('latin-1').partition(':')
+        headers[name.strip().lower()] = value.strip()
+    return method, path, version, headers
+
+
+def write_head(writer, status, headers):
+    ''' Status line and headers of a response '''
+    lines = [f"HTTP/1.1 {status} {REASONS[status]}"] + [f"{name}: {value}" for name, value in headers.items()]
+    writer.write(('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1'))
+
+
+def write_error(writer, method, error):
+    ''' Plain text response for an HTTPError '''
+    body = f"{error}\n".encode('utf-8')
+    write_head(writer, error.status, dict(error.headers, **{'Content-Type': 'text/plain', 'Content-Length': len(body)}))
+    if method != 'HEAD':
+        writer.write(body)
+
+
+async def fetch(host, port, path, headers=None):
+    ''' Loopback client, returns (status, headers, body) of one GET '''
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        lines = [f"GET {path} HTTP/1.1", f"Host: {host}", "Connection: close"]
+        lines += [f"{name}: {value}" for name, value in (headers or {}).items()]
+        writer.write(('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1'))
+        await writer.drain()
+        status = int((await reader.readline()).split()[1])
+        reply = {}
+        while True:
+            line = await reader.readline()
+            if not line.strip():
+                break
+            name, _sep, value = line.decode('latin-1').partition(':')
+            reply[name.strip().lower()] = value.strip()
+        body = await reader.readexactly(int(reply.get('content-length', 0)))
+        return status, reply, body
+    finally:
+        writer.close()
+
+
+async def run(filename, host, port, catalogues):
+    server = dfs_server(filename, catalogues)
+    try:
+        listener = await server.serve(host, port)
+        async with listener:
+            print(f"Serving {filename} on http://{host}:{port}/", file=sys.stderr)
+            await listener.serve_forever()
+    finally:
+        server.close()
+
+
+def cli(argv=None):
+    ''' Run from command-line '''
+    parser = argparse.ArgumentParser(description="Serve an SSD, DSD or MMB image over HTTP")
+    parser.add_argument("image", help="SSD, DSD or MMB image")
+    parser.add_argument("--host", default="127.0.0.1", help="address to listen on")
+    parser.add_argument("-p", "--port", type=int, default=8080, help="port to listen on")
+    parser.add_argument("-c", "--catalogues", type=int, default=64, help="decoded catalogues to keep")
+    args = parser.parse_args(argv)
+    try:
+        asyncio.run(run(args.image, args.host, args.port, args.catalogues))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(cli())
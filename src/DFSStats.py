@@ -0,0 +1,98 @@
+''' Optional counters and phase timers for the image I/O paths '''
+import time
+from functools import wraps
+
+STATS = None  # The active io_stats, None while instrumentation is off
+
+
+class io_stats:
+    ''' Reads, bytes read, seeks, cache hits and wall time per phase '''
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        ''' Zero every counter '''
+        self.reads = 0
+        self.bytes_read = 0
+        self.seeks = 0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.caches = {}  # Name -> [hits, misses]
+        self.calls = {}
+        self.seconds = {}
+
+    def read(self, size, seek=False):
+        ''' Count one read '''
+        self.reads += 1
+        self.bytes_read += size
+        if seek:
+            self.seeks += 1
+
+    def cache(self, hit, name=None):
+        ''' Count one cache lookup, in total and for the named cache '''
+        if hit:
+            self.cache_hits += 1
+        else:
+            self.cache_misses += 1
+        if name:
+            self.caches.setdefault(name, [0, 0])[0 if hit else 1] += 1
+
+    def add_time(self, name, seconds):
+        ''' Add a call and its wall time to a phase '''
+        self.calls[name] = self.calls.get(name, 0) + 1
+        self.seconds[name] = self.seconds.get(name, 0.0) + seconds
+
+    def as_dict(self):
+        ''' Everything counted, ready for JSON '''
+        return {
+            'reads': self.reads,
+            'bytes_read': self.bytes_read,
+            'seeks': self.seeks,
+            'cache_hits': self.cache_hits,
+            'cache_misses': self.cache_misses,
+            'caches': {name: {'hits': hits, 'misses': misses} for name, (hits, misses) in self.caches.items()},
+            'phases': {name: {'calls': self.calls[name], 'seconds': self.seconds[name]} for name in self.calls},
+        }
+
+    def report(self):
+        ''' Human readable summary '''
+        lines = [
+            f"reads {self.reads}, bytes read {self.bytes_read}, seeks {self.seeks}, "
+            f"cache hits {self.cache_hits}, misses {self.cache_misses}"
+        ]
+        for name, (hits, misses) in sorted(self.caches.items()):
+            lines.append(f"{name + ' cache':20s} {hits:8d} hits {misses:8d} misses")
+        for name in sorted(self.seconds, key=self.seconds.get, reverse=True):
+            lines.append(f"{name:20s} {self.calls[name]:8d} calls {self.seconds[name]:10.6f}s")
+        return '\n'.join(lines)
+
+
+def enable(stats=None):
+    ''' Turn instrumentation on, returns the active io_stats '''
+    global STATS
+    STATS = stats or io_stats()
+    return STATS
+
+
+def disable():
+    ''' Turn instrumentation off '''
+    global STATS
+    STATS = None
+
+
+def timed(name):
+    ''' Decorator adding the wall time of each call to a phase while enabled '''
+    def decorate(function):
+        @wraps(function)
+        def wrapper(*args, **kwargs):
+            stats = STATS
+            if stats is None:
+                return function(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                stats.add_time(name, time.perf_counter() - start)
+        return wrapper
+    return decorate
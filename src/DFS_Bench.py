@@ -0,0 +1,202 @@
+''' Benchmarks on synthetic SSD/DSD/MMB images and BASIC programs, results as JSON '''
+import argparse
+import io
+import json
+import os
+import platform
+import random
+import shutil
+import sys
+import tempfile
+import time
+from struct import pack_into
+
+from BBCBasicToText import Decode, Tokenise
+from PyAcornDFS import DISK_SIZE, MMB_HEADER, TRACK_SIZE, acorn_dfs, convert_dsd, read_mmb, map_image
+
+
+def make_ssd(rng, title, file_count):
+    ''' A 200K disk holding file_count files of random data '''
+    data = bytearray(DISK_SIZE)
+    title = title.encode('ascii')[:12].ljust(12, b'\x00')
+    data[0:8] = title[:8]
+    data[0x100:0x104] = title[8:]
+    data[0x105] = file_count << 3
+    data[0x106] = 0x03  # 800 sectors
+    data[0x107] = 0x20
+    start = 2
+    entries = []
+    for index in range(file_count):
+        size = rng.randint(1, 25 * 256)
+        entries.append((f"F{index:02d}".encode('ascii').ljust(7), size, start))
+        data[start * 256:start * 256 + size] = rng.randbytes(size)
+        start += (size + 255) >> 8
+    for slot, (name, size, start) in enumerate(reversed(entries), 1):
+        data[slot * 8:slot * 8 + 7] = name
+        data[slot * 8 + 7] = ord('$')
+        pack_into('<HHHBB', data, 0x100 + slot * 8, 0x1900, 0x8023, size & 0xFFFF,
+                  ((start >> 8) & 3) | (((size >> 16) & 3) << 4), start & 0xFF)
+    return data
+
+
+def make_dsd(rng, file_count):
+    ''' Two sides interleaved a track at a time '''
+    sides = [make_ssd(rng, f"SIDE{side}", file_count) for side in range(2)]
+    return b''.join(
+        side[position:position + TRACK_SIZE] for position in range(0, DISK_SIZE, TRACK_SIZE) for side in sides
+    )
+
+
+def make_mmb(rng, disk_count, file_count):
+    ''' An MMB of disk_count formatted disks '''
+    header = bytearray(MMB_HEADER)
+    disks = []
+    for din in range(disk_count):
+        disks.append(make_ssd(rng, f"DIN{din}", file_count))
+        header[(din + 1) * 16:(din + 1) * 16 + 12] = f"DIN{din}".encode('ascii').ljust(12, b'\x00')
+        header[(din + 1) * 16 + 15] = 0x0F
+    return bytes(header) + b''.join(disks)
+
+
+def make_basic(rng, size):
+    ''' A tokenised BASIC program of about size bytes '''
+    words = [b'A%', b'X', b'=', b'+', b'10', b'"TEXT"', b' ', b',', b'(', b')']
+    tokens = [bytes([token]) for token in range(0x80, 0x100) if token not in (0x8D, 0xDC, 0xF4)]
+    program = bytearray()
+    number = 10
+    while len(program) < size - 260:
+        line = bytearray()
+        while len(line) < rng.randint(10, 80):
+            line += rng.choice(tokens) if rng.random() < 0.3 else rng.choice(words)
+        if rng.random() < 0.1:
+            line += b'\xf4 A comment'
+        program += bytes([13, number >> 8, number & 0xFF, len(line) + 4]) + line
+        number += 10
+    return bytes(program + b'\r\xff')
+
+
+def make_listing(rng, size):
+    ''' A BASIC listing of about size bytes, as Decode would write it '''
+    statements = [
+        b'PRINT "SCORE ";S%%', b'A=PAGE', b'PAGE=&1900', b'IF X>10 THEN %d ELSE %d', b'GOTO %d',
+        b'GOSUB %d', b'ON X GOTO %d,%d', b'FOR I%%=1 TO %d STEP 2:NEXT', b'PROCdraw(X,Y)',
+        b'A$=FNname(LEFT$(B$,3))', b'REM comment GOTO %d', b'DATA 1,2,PRINT', b'*FX 200,%d',
+        b'TIMER=TIME', b'VDU 23,1,0;0;0;0;', b'  REPEAT:UNTIL INKEY(0)=-1', b'DEFPROCdraw(X,Y)',
+        b'MOVE X,Y:DRAW X+%d,Y', b'ENDPROC', b'END',
+    ]
+    listing = bytearray()
+    number = 10
+    while len(listing) < size:
+        parts = []
+        for _ in range(rng.randint(1, 4)):
+            statement = rng.choice(statements)
+            parts.append(statement % tuple(rng.randrange(10, 3000, 10) for _ in range(statement.count(b'%d'))))
+        listing += b'%d %s\r' % (number, b':'.join(parts))
+        number += 10
+    return bytes(listing)
+
+
+def timed(function, repeat=3):
+    ''' Best wall time of a few runs '''
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def read_all(filename, hashing=False):
+    ''' Read, or hash, every file of an image '''
+    with acorn_dfs(filename) as image:
+        for din, file_index, _info in image.disk_info.file_table():
+            if hashing:
+                image.get_md5(din, file_index)
+            else:
+                image.get_data(din, file_index)
+
+
+def read_mmb_only(filename):
+    ''' read_mmb and every catalogue, without acorn_dfs '''
+    mmb, view = map_image(filename)
+    list(read_mmb(view))
+    view.release()
+    mmb.close()
+
+
+def run(work_dir, disk_count=511, file_count=31, workers=None, seed=1):
+    ''' Run every benchmark, returns a dict ready for JSON '''
+    rng = random.Random(seed)
+    images = {'ssd': os.path.join(work_dir, 'bench.ssd'), 'dsd': os.path.join(work_dir, 'bench.dsd')}
+    with open(images['ssd'], 'wb') as file_p:
+        file_p.write(make_ssd(rng, 'BENCH', file_count))
+    with open(images['dsd'], 'wb') as file_p:
+        file_p.write(make_dsd(rng, file_count))
+    for count in sorted({0, 1, disk_count}):
+        images[f'mmb_{count}'] = os.path.join(work_dir, f'bench_{count}.mmb')
+        with open(images[f'mmb_{count}'], 'wb') as file_p:
+            file_p.write(make_mmb(rng, count, file_count))
+
+    results = {}
+    for name, filename in images.items():
+        results[f'open_image.{name}'] = timed(lambda: acorn_dfs(filename).close())
+        results[f'get_data.{name}'] = timed(lambda: read_all(filename))
+        results[f'get_md5.{name}'] = timed(lambda: read_all(filename, True))
+        if name.startswith('mmb'):
+            results[f'read_mmb.{name}'] = timed(lambda: read_mmb_only(filename))
+    results['convert_dsd'] = timed(lambda: convert_dsd(images['dsd'], os.path.join(work_dir, 'out.ssd')))
+    for size in (1024, 8192, 32768):
+        program = make_basic(rng, size)
+        results[f'Decode.{size}'] = timed(lambda: Decode(program, io.BytesIO()))
+    round_trip = {}
+    for size in (1024, 8192, 32768):
+        listing = make_listing(rng, size)
+        results[f'Tokenise.{size}'] = timed(lambda: Tokenise(listing))
+        output = io.BytesIO()
+        Decode(Tokenise(listing), output)
+        round_trip[f'Tokenise.{size}'] = output.getvalue() == listing
+    for count in sorted({1, workers or os.cpu_count() or 1}):
+        dest = os.path.join(work_dir, f'extract_{count}')
+        filename = images[f'mmb_{disk_count}']
+
+        def extract():
+            shutil.rmtree(dest, ignore_errors=True)
+            with acorn_dfs(filename) as image:
+                image.extract_all(dest, count, basic=True)
+
+        results[f'extract_all.workers_{count}'] = timed(extract, 1)
+    return {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'disk_count': disk_count,
+        'file_count': file_count,
+        'seed': seed,
+        'seconds': results,
+        'round_trip': round_trip,
+    }
+
+
+def cli(argv=None):
+    ''' Run from command-line '''
+    parser = argparse.ArgumentParser(description="Benchmark the Acorn DFS library")
+    parser.add_argument("--disks", type=int, default=511, help="DINs in the largest MMB")
+    parser.add_argument("--files", type=int, default=31, help="files per disk")
+    parser.add_argument("-j", "--workers", type=int, default=None, help="workers for extract_all")
+    parser.add_argument("--seed", type=int, default=1, help="random seed for the images")
+    parser.add_argument("-o", "--out", help="write the JSON here instead of stdout")
+    args = parser.parse_args(argv)
+    with tempfile.TemporaryDirectory() as work_dir:
+        report = run(work_dir, args.disks, args.files, args.workers, args.seed)
+    text = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, 'w') as file_p:
+            file_p.write(text + '\n')
+    else:
+        print(text)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(cli())
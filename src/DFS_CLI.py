@@ -0,0 +1,301 @@
+''' Command line interface for the Acorn DFS library '''
+import argparse
+import csv
+import json
+import os
+import sys
+
+import DFSStats
+from PyAcornDFS import acorn_dfs, build_mmb, free_map, is_basic
+from BBCBasicToText import iter_lines
+from DFSHash import DEFAULT_INDEX, get_hasher, hash_index
+from DFSCache import catalogue_cache
+from DFSCheck import check_images
+from DFSQuery import file_index, parse_range
+
+
+FILE_COLUMNS = ('image', 'din', 'file', 'ext', 'name', 'locked', 'load', 'exec', 'size', 'start', 'hash')
+DATA_COLUMNS = ('hash',)
+DISK_COLUMNS = ('image', 'din', 'title', 'status', 'cycle', 'boot', 'sectors', 'free', 'files')
+
+
+def row_writer(output, columns, output_format):
+    ''' Function writing one row, as a JSON line or CSV record, straight to the output '''
+    if output_format == 'csv':
+        writer = csv.writer(output)
+        writer.writerow(columns)
+        return lambda row: writer.writerow([row[column] for column in columns])
+    return lambda row: output.write(json.dumps({column: row[column] for column in columns}) + '\n')
+
+
+def get_columns(text, allowed):
+    ''' Split a --columns argument, checking every name '''
+    columns = tuple(column.strip() for column in text.split(','))
+    unknown = [column for column in columns if column not in allowed]
+    if unknown:
+        raise argparse.ArgumentTypeError(f"unknown column(s) {', '.join(unknown)}, use {', '.join(allowed)}")
+    return columns
+
+
+def image_dest(dest_dir, filename, image_count):
+    ''' Each image gets its own directory when there are several '''
+    if image_count > 1:
+        return os.path.join(dest_dir, os.path.splitext(os.path.basename(filename))[0])
+    return dest_dir
+
+
+def open_images(args):
+    ''' Yield each image named on the command line, using the cache if asked.
+        Images that cannot be read are reported and set args.status '''
+    cache = catalogue_cache(args.cache) if args.cache else None
+    try:
+        for filename in args.images:
+            try:
+                with acorn_dfs(filename, cache) as image:
+                    yield filename, image
+            except Exception as error:
+                print(f"{filename}: {error}", file=sys.stderr)
+                args.status = 1
+    finally:
+        if cache:
+            cache.close()
+
+
+def cat(args):
+    ''' One row per file, file data is only read for the hash column '''
+    write = row_writer(sys.stdout, args.columns, args.format)
+    hasher = get_hasher(args.algorithm) if set(args.columns) & set(DATA_COLUMNS) else None
+    args.status = 0
+    for filename, image in open_images(args):
+        for din, file_index, info in image.disk_info.file_table():
+            row = {
+                'image': filename, 'din': din, 'file': file_index, 'ext': info.ext, 'name': info.name,
+                'locked': info.lock == 'L', 'load': info.load_addr, 'exec': info.exec_addr,
+                'size': info.size, 'start': info.start,
+            }
+            if hasher:
+                row['hash'] = hasher(image.get_data(din, file_index)[0])
+            write(row)
+    return args.status
+
+
+def info(args):
+    ''' One row per disk, from the catalogues alone '''
+    write = row_writer(sys.stdout, args.columns, args.format)
+    args.status = 0
+    for filename, image in open_images(args):
+        for din, disk in enumerate(image.disk_info):
+            if not disk:
+                continue
+            write({
+                'image': filename, 'din': din, 'title': image.get_disk_title(din), 'status': disk.status,
+                'cycle': disk.cycle, 'boot': disk.boot, 'sectors': disk.sector_count,
+                'free': free_map(disk).count(0), 'files': disk.file_count,
+            })
+    return args.status
+
+
+def basic(args):
+    ''' One row per line of every BASIC program, or of the files named '''
+    write = row_writer(sys.stdout, ('image', 'din', 'file', 'name', 'line', 'text'), args.format)
+    args.status = 0
+    for filename, image in open_images(args):
+        for din, file_index, info in image.disk_info.file_table():
+            name = f"{info.ext}.{info.name}"
+            if args.name and args.name.upper() not in (name.upper(), info.name.upper()):
+                continue
+            data, _name = image.get_data(din, file_index)
+            if not is_basic(data):
+                continue
+            try:
+                for line_number, text in iter_lines(data):
+                    write({
+                        'image': filename, 'din': din, 'file': file_index, 'name': name,
+                        'line': line_number, 'text': bytes(text).decode('latin-1'),
+                    })
+            except BrokenPipeError:
+                raise
+            except Exception as error:
+                print(f"{filename}: DIN {din} {name}: {error}", file=sys.stderr)
+                args.status = 1
+    return args.status
+
+
+def extract(args):
+    ''' Extract every disk and file of the images '''
+    args.status = status = 0
+    for filename, image in open_images(args):
+        dest_dir = image_dest(args.dest, filename, len(args.images))
+        for din, file_index, path, error in image.extract_all(dest_dir, args.workers, args.basic):
+            if error:
+                print(f"{filename}: DIN {din} file {file_index}: {error}", file=sys.stderr)
+                status = 1
+            elif args.verbose:
+                print(path)
+    return status or args.status
+
+
+def dupes(args):
+    ''' Report files held more than once across disks and images '''
+    with hash_index(args.index, args.algorithm) as index:
+        for filename in args.images:
+            index.add_image(filename)
+        for digest, size, copies in index.duplicates():
+            print(f"{digest} {size:06X} {len(copies)} copies")
+            for image, din, file_index, name in copies:
+                print(f"    {image} DIN {din} file {file_index} {name}")
+    return 0
+
+
+def build(args):
+    ''' Build an MMB from SSD/DSD images and directories of them '''
+    inputs = []
+    for name in args.inputs:
+        if os.path.isdir(name):
+            inputs.extend(
+                os.path.join(name, entry) for entry in sorted(os.listdir(name))
+                if os.path.splitext(entry)[1].lower() in ('.ssd', '.dsd')
+            )
+        else:
+            inputs.append(name)
+    print(f"{args.out}: {build_mmb(inputs, args.out)} disk(s)")
+    return 0
+
+
+def fsck(args):
+    ''' Check, and optionally repair, the catalogues of the images '''
+    status = 0
+    for filename, problems in check_images(args.images, args.repair, args.compact, args.workers):
+        for din, file_index, code, message in problems:
+            where = f"DIN {din}" if file_index is None else f"DIN {din} file {file_index}"
+            print(f"{filename}: {where}: {code}: {message}")
+            if code != 'orphan':
+                status = 1
+    return status
+
+
+def find(args):
+    ''' List the files matching every filter given '''
+    cache = catalogue_cache(args.cache) if args.cache else None
+    index = file_index(args.algorithm if args.hash else None, cache)
+    try:
+        for filename in args.images:
+            try:
+                index.add_image(filename)
+            except Exception as error:
+                print(f"{filename}: {error}", file=sys.stderr)
+    finally:
+        if cache:
+            cache.close()
+    rows = index.query(
+        args.name, args.dir, args.load, args.exec_addr, args.size, None,
+        True if args.locked else False if args.unlocked else None, args.hash,
+    )
+    for row in rows:
+        info = index.record(row)
+        lock = 'L' if info['locked'] else ' '
+        print(
+            f"{info['image']} DIN {info['din']} {info['ext']}.{info['name']:7} {lock} "
+            f"{info['load']:08X} {info['exec']:08X} {info['size']:06X}"
+        )
+    return 0 if rows else 1
+
+
+def make_parser():
+    ''' Build the argument parser '''
+    parser = argparse.ArgumentParser(description="Acorn DFS SSD/DSD/MMB tools")
+    parser.add_argument("--cache", help="catalogue cache database to use")
+    parser.add_argument("--stats", action="store_true", help="report I/O counts and timings")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    formats = argparse.ArgumentParser(add_help=False)
+    formats.add_argument("images", nargs="+", help="SSD, DSD or MMB images")
+    formats.add_argument("-f", "--format", choices=("jsonl", "csv"), default="jsonl", help="output format")
+
+    command = commands.add_parser("cat", parents=[formats], help="list the files of the images")
+    command.add_argument(
+        "-c", "--columns", type=lambda text: get_columns(text, FILE_COLUMNS),
+        default=FILE_COLUMNS[:-1], help=f"columns to output from {','.join(FILE_COLUMNS)}",
+    )
+    command.add_argument("-a", "--algorithm", default="md5", help="algorithm of the hash column")
+    command.set_defaults(func=cat)
+
+    command = commands.add_parser("hash", parents=[formats], help="hash every file of the images")
+    command.add_argument(
+        "-c", "--columns", type=lambda text: get_columns(text, FILE_COLUMNS),
+        default=('image', 'din', 'file', 'ext', 'name', 'size', 'hash'),
+        help=f"columns to output from {','.join(FILE_COLUMNS)}",
+    )
+    command.add_argument("-a", "--algorithm", default="md5", help="md5, sha1, crc32, xxh64, ...")
+    command.set_defaults(func=cat)
+
+    command = commands.add_parser("info", parents=[formats], help="list the disks of the images")
+    command.add_argument(
+        "-c", "--columns", type=lambda text: get_columns(text, DISK_COLUMNS),
+        default=DISK_COLUMNS, help=f"columns to output from {','.join(DISK_COLUMNS)}",
+    )
+    command.set_defaults(func=info)
+
+    command = commands.add_parser("basic", parents=[formats], help="detokenise BASIC programs")
+    command.add_argument("-n", "--name", help="only this file, e.g. $.MENU")
+    command.set_defaults(func=basic)
+
+    command = commands.add_parser("extract", help="extract every disk and file")
+    command.add_argument("images", nargs="+", help="SSD, DSD or MMB images")
+    command.add_argument("-d", "--dest", default=".", help="destination directory")
+    command.add_argument("-j", "--workers", type=int, default=None, help="worker processes")
+    command.add_argument("-b", "--basic", action="store_true", help="also detokenise BASIC")
+    command.add_argument("-v", "--verbose", action="store_true", help="list the files written")
+    command.set_defaults(func=extract)
+
+    command = commands.add_parser("dupes", help="find duplicate files")
+    command.add_argument("images", nargs="+", help="SSD, DSD or MMB images")
+    command.add_argument("-i", "--index", default=DEFAULT_INDEX, help="hash index database to keep, :memory: for none")
+    command.add_argument("-a", "--algorithm", default="md5", help="md5, sha1, crc32, xxh64, ...")
+    command.set_defaults(func=dupes)
+
+    command = commands.add_parser("build", help="build an MMB from SSD/DSD images")
+    command.add_argument("out", help="MMB to create")
+    command.add_argument("inputs", nargs="+", help="SSD/DSD images or directories of them")
+    command.set_defaults(func=build)
+
+    command = commands.add_parser("fsck", help="check and repair catalogues")
+    command.add_argument("images", nargs="+", help="SSD, DSD or MMB images")
+    command.add_argument("-r", "--repair", action="store_true", help="repair the problems found")
+    command.add_argument("-c", "--compact", action="store_true", help="compact away unused sectors")
+    command.add_argument("-j", "--workers", type=int, default=None, help="worker processes")
+    command.set_defaults(func=fsck)
+
+    command = commands.add_parser("find", help="search the catalogues of the images")
+    command.add_argument("images", nargs="+", help="SSD, DSD or MMB images")
+    command.add_argument("-n", "--name", help="file name, * ? and [] globs allowed")
+    command.add_argument("-D", "--dir", help="directory letter")
+    command.add_argument("-l", "--load", type=parse_range, help="load address or range, e.g. &1900-&3000")
+    command.add_argument("-e", "--exec", dest="exec_addr", type=parse_range, help="execution address or range")
+    command.add_argument("-s", "--size", type=parse_range, help="size or range")
+    command.add_argument("-H", "--hash", help="content hash")
+    command.add_argument("-a", "--algorithm", default="md5", help="algorithm of --hash")
+    locks = command.add_mutually_exclusive_group()
+    locks.add_argument("-L", "--locked", action="store_true", help="locked files only")
+    locks.add_argument("-U", "--unlocked", action="store_true", help="unlocked files only")
+    command.set_defaults(func=find)
+    return parser
+
+
+def cli(argv=None):
+    ''' Run from command-line '''
+    args = make_parser().parse_args(argv)
+    stats = DFSStats.enable() if args.stats else None
+    try:
+        return args.func(args)
+    except BrokenPipeError:
+        # The reader, e.g. head, has gone, stop quietly
+        os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+        return 1
+    finally:
+        if stats:
+            print(stats.report(), file=sys.stderr)
+
+
+if __name__ == "__main__":
+    sys.exit(cli())
@@ -1,11 +1,16 @@
 import os
 from pathlib import Path
-from tkinter import Tk, Menu, Button, Label, filedialog, Y, LEFT, Canvas
+from concurrent.futures import ThreadPoolExecutor, wait
+from queue import Queue, Empty
+from threading import Event, Lock, Thread
+from tkinter import Tk, Toplevel, Frame, Menu, Button, Label, filedialog, Y, X, LEFT, RIGHT, BOTTOM, Canvas, PhotoImage, NW, NORMAL, DISABLED
 from tkinter.filedialog import askopenfilename
-from tkinter.ttk import Combobox, Treeview
+from tkinter.ttk import Combobox, Treeview, Progressbar
 from webbrowser import open_new
 
-from PyAcornDFS import acorn_dfs
+from PyAcornDFS import SECTOR_CACHE, acorn_dfs, lru_dict
+from DFSCache import catalogue_cache
+from BBCScreen import MODES, render_ppm
 
 
 def get_file(ext='ssd', title="Select file"):
@@ -25,11 +30,21 @@ class dfs_gui(acorn_dfs):
     ''' GUI for Acorn DFS '''
 
     def __init__(self):
+        self.cache = catalogue_cache(os.path.join(Path.home(), ".pyacorndfs.db"))
+        self.sectors = lru_dict(SECTOR_CACHE, len, 'sector')
         self.root = Tk()
         self.set_title()
         self.root.geometry("1024x768")
         # root.iconbitmap(bitmap=os.path.join(os.path.dirname(__file__), 'Owl.ico'))
+        self.loads = Queue()
+        self.load_lock = Lock()
+        self.load_count = 0
+        self.screens = {}
+        self.pool = ThreadPoolExecutor(max_workers=os.cpu_count())
+        self.jobs = []
+        self.cancelled = Event()
         self.make_menu()
+        self.make_status()
         self.tree = self.make_tree()
         # icons = get_icons()
         self.cursor = "wait" if os.name == 'nt' else "clock"
@@ -41,24 +56,20 @@ class dfs_gui(acorn_dfs):
             text += ' - '
         self.root.title(f"{text}Acorn DFS ")
 
-    def show_screen(self, data):
-        ''' Show Mode Zero Screen for Debug '''
-        if data:
-            height, _mod = divmod(len(data), 80)
-            if height >= 1:
-                x = 0
-                y = 0
-                self.window = Canvas(self.root, width=640, height=height)
-                self.window.pack()
-                for value in data:
-                    for offset in range(8):
-                        if value & (1 << (7 - offset)):
-                            self.window.create_line(x, y, x + 1, y)
-                            # self.window.create_rectangle((x, y) * 2)
-                        x += 1
-                    if x == 640:
-                        x = 0
-                        y += 1
+    def show_screen(self, data, mode=0, key=None):
+        ''' Show a screen dump as a single image, rendered images are kept per file '''
+        image = self.screens.get((key, mode)) if key else None
+        if image is None and data:
+            image = PhotoImage(data=render_ppm(data, mode), format='PPM')
+            if key:
+                self.screens[(key, mode)] = image
+        if image is not None:
+            window = Toplevel(self.root)
+            window.title(f"MODE {mode}")
+            canvas = Canvas(window, width=image.width(), height=image.height())
+            canvas.create_image(0, 0, image=image, anchor=NW)
+            canvas.image = image  # Keep a reference for Tk
+            canvas.pack()
 
     def Open(self):
         ''' Get a new file to process '''
@@ -88,33 +99,94 @@ class dfs_gui(acorn_dfs):
 
     def save(self):
         ''' Save node(s) '''
-        for node in self.get_selection():
+        tasks = []
+        for node in self.tree.selection():
             index = node.split()
             temp = len(index)
             if temp == 1:
-                self.write_ssd(int(index[0]))
+                tasks.append((self.write_ssd, int(index[0])))
             elif temp == 2:
-                self.write_file(int(index[0]), int(index[1]))
-        self.root.config(cursor="")
+                tasks.append((self.write_file, int(index[0]), int(index[1])))
+        self.run_jobs(tasks)
 
     def basic(self):
         ''' Extract Basic '''
-        for node in self.get_selection():
+        tasks = []
+        for node in self.tree.selection():
             index = node.split()
             temp = len(index)
             if temp == 2:
-                self.extract_basic(int(index[0]), int(index[1]))
-        self.root.config(cursor="")
+                tasks.append((self.extract_basic, int(index[0]), int(index[1])))
+        self.run_jobs(tasks)
 
-    def mode_zero(self):
+    def run_jobs(self, tasks):
+        ''' Queue exports on the worker pool, they all share the open mapping '''
+        if not tasks:
+            return
+        if not self.jobs:
+            self.cancelled.clear()
+            self.root.after(100, self.poll_jobs)
+        self.jobs += [self.pool.submit(self.run_task, *task) for task in tasks]
+        self.cancel_button.config(state=NORMAL)
+        self.show_progress()
+
+    def run_task(self, function, *args):
+        ''' Worker thread: run one export, returns an error message or None '''
+        if self.cancelled.is_set():
+            return None
+        try:
+            function(*args)
+        except Exception as error:
+            return f"{function.__name__}{args}: {error}"
+        return None
+
+    def cancel_jobs(self):
+        ''' Drop queued exports, those already running are allowed to finish '''
+        self.cancelled.set()
+        for job in self.jobs:
+            job.cancel()
+
+    def show_progress(self):
+        ''' Update the progress bar, returns the number of finished jobs '''
+        done = sum(job.done() for job in self.jobs)
+        self.progress.config(maximum=len(self.jobs), value=done)
+        self.status.config(text=f"Exported {done} of {len(self.jobs)}")
+        return done
+
+    def poll_jobs(self):
+        ''' Track the worker pool from the Tk main loop '''
+        if self.show_progress() < len(self.jobs):
+            self.root.after(100, self.poll_jobs)
+            return
+        errors = [job.result() for job in self.jobs if not job.cancelled() and job.result()]
+        cancelled = sum(job.cancelled() for job in self.jobs)
+        text = f"Exported {len(self.jobs) - cancelled - len(errors)} of {len(self.jobs)}"
+        if cancelled:
+            text += f", {cancelled} cancelled"
+        if errors:
+            text += f", {len(errors)} failed: {errors[0]}"
+        self.status.config(text=text)
+        self.cancel_button.config(state=DISABLED)
+        self.jobs = []
+
+    def show_mode(self, mode=0):
         ''' Show Image '''
         for node in self.get_selection():
             index = node.split()
             temp = len(index)
             if temp == 2:
-                self.show_screen(self.get_data(int(index[0]), int(index[1])))
+                key = (self.filename, int(index[0]), int(index[1]))
+                if (key, mode) in self.screens:
+                    self.show_screen(None, mode, key)
+                else:
+                    data, _name = self.get_data(int(index[0]), int(index[1]))
+                    self.show_screen(data, mode, key)
         self.root.config(cursor="")
 
+    def mode_zero(self):
+        ''' Show Image '''
+        self.show_mode(0)
+
     def make_menu(self):
         ''' Menu Bar '''
         self.menu = Menu(self.root)
@@ -142,6 +214,21 @@ class dfs_gui(acorn_dfs):
         self.popup.add_command(label="Save", command=self.save)
         self.popup.add_command(label="Extract Basic", command=self.basic)
         self.popup.add_command(label="Mode Zero", command=self.mode_zero)
+        self.screen_menu = Menu(self.popup, tearoff=0)
+        for mode in MODES:
+            self.screen_menu.add_command(label=f"MODE {mode}", command=lambda mode=mode: self.show_mode(mode))
+        self.popup.add_cascade(label="Screen", menu=self.screen_menu)
+
+    def make_status(self):
+        ''' Status bar with export progress and a cancel button '''
+        bar = Frame(self.root)
+        self.cancel_button = Button(bar, text="Cancel", command=self.cancel_jobs, state=DISABLED)
+        self.cancel_button.pack(side=RIGHT)
+        self.progress = Progressbar(bar, length=200, mode='determinate')
+        self.progress.pack(side=RIGHT)
+        self.status = Label(bar, anchor='w')
+        self.status.pack(fill=X, side=LEFT, expand=True)
+        bar.pack(fill=X, side=BOTTOM)
 
     def make_tree(self):
         ''' Build a Tree '''
@@ -164,40 +251,87 @@ class dfs_gui(acorn_dfs):
         tree.heading("Sector", text="Sector")
         self.make_popup(tree)
         tree.bind("<Button-3>", do_popup)
+        tree.bind("<<TreeviewOpen>>", self.open_disk)
         tree.pack(fill=Y, side=LEFT)
         return tree
 
     def change_file(self, filename=None):
-        ''' Add a device to the tree '''
-        for child in self.tree.get_children():
-            self.tree.delete(child)
-        self.open_image(filename)
-        self.set_title(self.filename)
-        if self.disk_info:
-            for disk_index, disk in enumerate(self.disk_info):
-                if disk:
-                    detail = f"Contains {disk['file_count']} file(s)"
-                    dev = self.tree.insert(
-                        "",
-                        "end",
-                        [disk_index],
-                        text=f"Disk {disk_index}: {disk['title']}",
-                        values=detail,
-                    )
-                    for file_index, info in enumerate(disk['file_info']):
-                        columns = (
-                            f"{info['load_&']:08X}",
-                            f"{info['exec_&']:08X}",
-                            f"{info['size']:06X}",
-                            f"{info['start']:03X}",
-                        )
-                        self.tree.insert(
-                            dev,
-                            "end",
-                            [disk_index, file_index],
-                            text=f"{info['ext']}.{info['name']}",
-                            values=columns,
-                        )
-
-
-dfs_gui()
+        ''' Add a device to the tree, the catalogue is read on a worker thread '''
+        self.tree.delete(*self.tree.get_children())
+        self.screens.clear()
+        self.cancel_jobs()
+        self.load_count += 1
+        self.root.config(cursor=self.cursor)
+        Thread(target=self.load_image, args=(filename, self.load_count), daemon=True).start()
+        self.root.after(50, self.poll_load)
+
+    def load_image(self, filename, load_id):
+        ''' Worker thread: open the image and summarise its disks '''
+        try:
+            with self.load_lock:
+                wait(self.jobs)  # Running exports still use the old mapping
+                self.open_image(filename)
+                disks = []
+                if self.disk_info:
+                    for disk_index, disk in enumerate(self.disk_info):
+                        if disk:
+                            disks.append((disk_index, disk['title'], disk['file_count']))
+            self.loads.put((load_id, self.filename, disks))
+        except Exception as error:
+            self.loads.put((load_id, f"{filename}: {error}", []))
+
+    def poll_load(self):
+        ''' Collect the result of a worker, then fill the tree a chunk at a time '''
+        try:
+            load_id, title, disks = self.loads.get_nowait()
+        except Empty:
+            self.root.after(50, self.poll_load)
+            return
+        if load_id == self.load_count:
+            self.set_title(title)
+            self.insert_disks(load_id, disks)
+
+    def insert_disks(self, load_id, disks, chunk=200):
+        ''' Insert disk nodes, each with a placeholder child until it is opened '''
+        if load_id != self.load_count:
+            return  # A newer file has been opened
+        for disk_index, title, file_count in disks[:chunk]:
+            dev = self.tree.insert(
+                "",
+                "end",
+                [disk_index],
+                text=f"Disk {disk_index}: {title}",
+                values=f"Contains {file_count} file(s)",
+            )
+            if file_count:
+                self.tree.insert(dev, "end", [disk_index, 0, "placeholder"], text="...")
+        if disks[chunk:]:
+            self.root.after(1, self.insert_disks, load_id, disks[chunk:], chunk)
+        else:
+            self.root.config(cursor="")
+
+    def open_disk(self, _event=None):
+        ''' Fill in the files of a disk node the first time it is opened '''
+        node = self.tree.focus()
+        children = self.tree.get_children(node)
+        if len(node.split()) != 1 or len(children) != 1 or len(children[0].split()) != 3:
+            return
+        self.tree.delete(children[0])
+        disk_index = int(node)
+        for file_index, info in enumerate(self.disk_info[disk_index]['file_info']):
+            columns = (
+                f"{info['load_&']:08X}",
+                f"{info['exec_&']:08X}",
+                f"{info['size']:06X}",
+                f"{info['start']:03X}",
+            )
+            self.tree.insert(
+                node,
+                "end",
+                [disk_index, file_index],
+                text=f"{info['ext']}.{info['name']}",
+                values=columns,
+            )
+
+if __name__ == "__main__":
+    dfs_gui()
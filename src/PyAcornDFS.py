@@ -1,11 +1,36 @@
 ''' Acorn DFS, library and GUI by Simon R. Ellwood '''
 import os
+import re
+import sys
+import mmap
+import zlib
 import hashlib
-from struct import pack_into, unpack_from
-from BBCBasicToText import Decode
+from collections import OrderedDict
+from contextlib import contextmanager, nullcontext
+from concurrent.futures import ProcessPoolExecutor
+from threading import RLock
+from struct import iter_unpack, pack, pack_into, unpack_from
+from BBCBasicToText import Decode, iter_lines
+import DFSStats
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None  # No locking where flock is missing
 
 MMB_HEADER = 0x2000
 DISK_SIZE = 256 * 10 * 80  # Sector size, Sector Count, Track Count
+TRACK_SIZE = 256 * 10  # A DSD interleaves the tracks of the two sides
+HIGH_ADDRESS = (0, 1, 2, 0xFFFF)  # extra_bits() for load and exec addresses
+MMB_STATUS = {0x00: 'locked', 0x0F: 'unlocked', 0xF0: 'unformatted', 0xFF: 'invalid'}
+SECTOR = 256
+JOURNAL_MAGIC = b'DFSJRNL1'
+CATALOGUE_CACHE = 128  # Decoded catalogues kept by each disk_list
+SECTOR_CACHE = 0x100000  # Bytes of copied sector ranges kept by each acorn_dfs
+
+
+class DFSError(Exception):
+    ''' A DFS operation that can not be done '''
 
 
 def from_acorn(text):
@@ -15,6 +40,41 @@ def from_acorn(text):
     return ""
 
 
+def to_acorn(text, size, pad=b' '):
+    ''' Convert to Acorn ASCII, padded to a catalogue field '''
+    data = text.replace('£', '`').encode('cp1252')
+    if len(data) > size:
+        raise DFSError(f"'{text}' is longer than {size} characters")
+    return data.ljust(size, pad)
+
+
+def next_cycle(cycle):
+    ''' Increment the BCD catalogue cycle number '''
+    high, low = divmod(cycle, 16)
+    if low >= 9:
+        return ((high + 1) % 10) << 4
+    return (high << 4) | (low + 1)
+
+
+def host_name(text):
+    ''' Make an Acorn name safe to use as a host file name '''
+    return re.sub(r'[\x00-\x1f/\\:*?"<>|]', '_', text).strip(' .') or '_'
+
+
+def is_basic(data):
+    ''' Does the data look like a tokenised BASIC program '''
+    return len(data) >= 2 and data[0] == 13 and data[-2] == 13 and data[-1] == 0xFF
+
+
+def extract_range(filename, first, last, dest_dir, basic=False):
+    ''' Extract a range of disks, one image mapping per worker '''
+    results = []
+    with acorn_dfs(filename) as image:
+        for index in range(first, last):
+            results.extend(image.extract_disk(index, dest_dir, basic))
+    return results
+
+
 def make_blank_ssd(filename):
     ''' Create a 200K Image '''
     data = bytearray(b'\x00') * DISK_SIZE
@@ -48,140 +108,872 @@ def extra_bits(value, bits, address=False):
     return temp
 
 
+class catalogue_record:
+    ''' Slotted catalogue entry that still reads like the old dicts '''
+    __slots__ = ()
+    KEYS = {}
+
+    def __getitem__(self, key):
+        try:
+            return getattr(self, self.KEYS[key])
+        except KeyError:
+            raise KeyError(key) from None
+
+    def __setitem__(self, key, value):
+        if key not in self.KEYS:
+            raise KeyError(key)
+        setattr(self, self.KEYS[key], value)
+
+    def __contains__(self, key):
+        return key in self.KEYS
+
+    def __repr__(self):
+        return f"{type(self).__name__}({dict(self)!r})"
+
+    def keys(self):
+        ''' The dict style keys '''
+        return self.KEYS.keys()
+
+    def get(self, key, default=None):
+        ''' Dict style get '''
+        return getattr(self, self.KEYS[key]) if key in self.KEYS else default
+
+
+class disk_record(catalogue_record):
+    ''' The Disc descriptor, the title is decoded when first used '''
+    __slots__ = ('raw_title', '_title', 'cycle', 'file_count', 'boot', 'sector_count',
+                 'offset', 'file_info', 'status')
+    KEYS = {key: key for key in ('title', 'cycle', 'file_count', 'boot', 'sector_count',
+                                 'offset', 'file_info', 'status')}
+
+    def __init__(self, raw_title, cycle, file_count, boot, sector_count, offset=0):
+        self.raw_title = raw_title
+        self._title = None
+        self.cycle = cycle
+        self.file_count = file_count
+        self.boot = boot
+        self.sector_count = sector_count
+        self.offset = offset
+        self.file_info = None
+        self.status = None
+
+    @property
+    def title(self):
+        ''' The decoded disk title '''
+        if self._title is None:
+            try:
+                self._title = from_acorn(self.raw_title)
+            except:
+                self._title = "Illegal"
+        return self._title
+
+    @title.setter
+    def title(self, value):
+        self._title = value
+
+
+class file_record(catalogue_record):
+    ''' A single catalogue entry, the name is decoded when first used '''
+    __slots__ = ('raw_name', '_name', 'raw_ext', 'load_addr', 'exec_addr', 'size', 'start', 'entry')
+    KEYS = {'name': 'name', 'lock': 'lock', 'ext': 'ext', 'load_&': 'load_addr',
+            'exec_&': 'exec_addr', 'size': 'size', 'start': 'start', 'offset': 'offset'}
+
+    def __init__(self, raw_name, raw_ext, load_addr, exec_addr, size, start, entry):
+        self.raw_name = raw_name
+        self._name = None
+        self.raw_ext = raw_ext
+        self.load_addr = load_addr
+        self.exec_addr = exec_addr
+        self.size = size
+        self.start = start
+        self.entry = entry
+
+    @property
+    def name(self):
+        ''' The decoded file name '''
+        if self._name is None:
+            try:
+                self._name = from_acorn(self.raw_name)
+            except:
+                self._name = "Illegal"
+        return self._name
+
+    @name.setter
+    def name(self, value):
+        self._name = value
+
+    @property
+    def lock(self):
+        ''' 'L' for a locked file '''
+        return 'L' if self.raw_ext & 0x80 else ' '
+
+    @property
+    def ext(self):
+        ''' The directory letter '''
+        return chr(self.raw_ext & 0x7F)
+
+    @property
+    def offset(self):
+        ''' Catalogue entry offset plus the start sector in bytes '''
+        return self.entry + (self.start << 8)
+
+
+class header_record(catalogue_record):
+    ''' The MMB header entry of a DIN, only the title of a formatted disk is decoded '''
+    __slots__ = ('raw_title', '_title', 'status')
+    KEYS = {'title': 'title', 'status': 'status'}
+
+    def __init__(self, raw_title, status):
+        self.raw_title = raw_title
+        self._title = None
+        self.status = status
+
+    @property
+    def title(self):
+        ''' The decoded disk title, empty for a slot without a disk '''
+        if self._title is None:
+            if self.status not in ('locked', 'unlocked'):
+                return ""
+            try:
+                self._title = from_acorn(self.raw_title)
+            except:
+                self._title = "Illegal"
+        return self._title
+
+    @title.setter
+    def title(self, value):
+        self._title = value
+
+
 def read_disk_info(data, offset=0):
     ''' Read the Disc descriptor '''
-    info = {}
     title1 = unpack_from('8s', data, offset)[0]
-    title2, info['cycle'], file_count, extra, sector_count = unpack_from(
-        '4sBBBB', data, offset + 256
-    )
-    info['title'] = from_acorn(title1 + title2)
-    info['file_count'] = file_count >> 3
-    info['boot'] = extra_bits(extra, 4)
+    title2, cycle, file_count, extra, sector_count = unpack_from('4sBBBB', data, offset + 256)
     sector_count += extra_bits(extra, 0) << 8
     if sector_count != 400 and sector_count != 800:
         return None
-    info['sector_count'] = sector_count
-    return info
+    return disk_record(title1 + title2, cycle, file_count >> 3, extra_bits(extra, 4), sector_count)
 
 
 def read_file_info(data, offset):
     ''' Read the information about a single file '''
-    info = {}
     name, ext = unpack_from('7sB', data, offset)
-    try:
-        info['name'] = from_acorn(name)
-    except:
-        info['name'] = "Illegal"
-    info['lock'] = 'L' if ext & 0x80 else ' '
-    info['ext'] = chr(ext & 0x7F)
-    info['load_&'], info['exec_&'], info['size'], extra, info['start'] = unpack_from(
-        'HHHBB', data, offset + 256
+    load, exe, size, extra, start = unpack_from('HHHBB', data, offset + 256)
+    return file_record(
+        name,
+        ext,
+        load + (extra_bits(extra, 2, True) << 16),
+        exe + (extra_bits(extra, 6, True) << 16),
+        size + (extra_bits(extra, 4) << 16),
+        start + (extra_bits(extra, 0) << 8),
+        offset,
     )
-    info['start'] += extra_bits(extra, 0) << 8
-    info['load_&'] += extra_bits(extra, 2, True) << 16
-    info['size'] += extra_bits(extra, 4) << 16
-    info['exec_&'] += extra_bits(extra, 6, True) << 16
 
-    info['offset'] = offset + (info['start'] << 8)
-    return info
 
+def map_image(filename, writable=False):
+    ''' Map an image file into memory, returns (mmap, memoryview) '''
+    with open(filename, "r+b" if writable else "rb") as file_p:
+        if os.fstat(file_p.fileno()).st_size == 0:
+            return None, memoryview(b'')  # Can't map an empty file
+        access = mmap.ACCESS_WRITE if writable else mmap.ACCESS_READ
+        image = mmap.mmap(file_p.fileno(), 0, access=access)
+    return image, memoryview(image)
 
-def read_surface(file_p, offset, size):
-    ''' Read part or all of a disk '''
-    file_p.seek(offset)
-    return file_p.read(size)
 
+def read_surface(image, offset, size):
+    ''' Read part or all of a disk, zero-copy when the image is mapped '''
+    stats = DFSStats.STATS
+    if hasattr(image, 'read'):
+        image.seek(offset)
+        data = image.read(size)
+        if stats is not None:
+            stats.read(len(data), True)
+        return data
+    data = image[offset:offset + size]
+    if stats is not None:
+        stats.read(len(data))
+    return data
 
-def read_catalogue(file_p, offset=0):
+
+def pwrite(file_p, data, offset):
+    ''' Positioned write, seek and write where os.pwrite is missing '''
+    if hasattr(os, 'pwrite'):
+        os.pwrite(file_p.fileno(), data, offset)
+    else:
+        file_p.seek(offset)
+        file_p.write(data)
+
+
+def write_journal(filename, runs):
+    ''' Write (offset, data) runs to a journal and flush it to disk before they are applied '''
+    body = [JOURNAL_MAGIC, pack('<I', len(runs))]
+    for offset, data in runs:
+        body.append(pack('<QI', offset, len(data)))
+        body.append(data)
+    body = b''.join(body)
+    with open(filename, "wb") as file_p:
+        file_p.write(body + pack('<I', zlib.crc32(body)))
+        file_p.flush()
+        os.fsync(file_p.fileno())
+
+
+def read_journal(filename):
+    ''' The (offset, data) runs of a complete journal, None if it was never finished '''
+    with open(filename, "rb") as file_p:
+        body = file_p.read()
+    if len(body) < 16 or body[:8] != JOURNAL_MAGIC:
+        return None
+    body, crc = body[:-4], unpack_from('<I', body, len(body) - 4)[0]
+    if zlib.crc32(body) != crc:
+        return None
+    runs = []
+    offset = 12
+    for _ in range(unpack_from('<I', body, 8)[0]):
+        position, length = unpack_from('<QI', body, offset)
+        offset += 12
+        runs.append((position, body[offset:offset + length]))
+        offset += length
+    return runs
+
+
+def apply_runs(filename, runs):
+    ''' Write (offset, data) runs to an image and flush it to disk '''
+    with open(filename, "r+b") as file_p:
+        for offset, data in runs:
+            pwrite(file_p, data, offset)
+        file_p.flush()
+        os.fsync(file_p.fileno())
+
+
+@contextmanager
+def image_lock(filename):
+    ''' Hold an exclusive lock on an image while its journal is written, applied or recovered '''
+    with open(filename, "rb") as file_p:
+        if fcntl is not None:
+            fcntl.flock(file_p.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(file_p.fileno(), fcntl.LOCK_UN)
+
+
+def recover_journal(filename):
+    ''' Finish a commit interrupted after its journal was written, drop an unfinished one '''
+    journal = filename + '.journal'
+    if os.path.exists(journal):
+        with image_lock(filename):
+            if os.path.exists(journal):  # Another writer may have finished it while we waited
+                runs = read_journal(journal)
+                if runs:
+                    apply_runs(filename, runs)
+                os.remove(journal)
+
+
+class staged_writes:
+    ''' Overlay on an image view that holds writes, a sector at a time, until commit '''
+
+    def __init__(self, view, header_size=0):
+        self.view = view
+        self.header_size = header_size
+        self.sectors = {}
+
+    def __len__(self):
+        return len(self.view)
+
+    def __getitem__(self, index):
+        start, stop, _step = index.indices(len(self.view))
+        first = start // SECTOR
+        last = (stop - 1) // SECTOR
+        if not any(sector in self.sectors for sector in range(first, last + 1)):
+            return self.view[start:stop]
+        data = b''.join(
+            self.sectors.get(sector) or self.view[sector * SECTOR:(sector + 1) * SECTOR]
+            for sector in range(first, last + 1)
+        )
+        return data[start - first * SECTOR:stop - first * SECTOR]
+
+    def __setitem__(self, index, data):
+        start, stop, _step = index.indices(len(self.view))
+        data = memoryview(data)
+        while start < stop:
+            sector, within = divmod(start, SECTOR)
+            if sector not in self.sectors:
+                self.sectors[sector] = bytearray(self.view[sector * SECTOR:(sector + 1) * SECTOR])
+            length = min(stop - start, SECTOR - within)
+            self.sectors[sector][within:within + length] = data[:length]
+            data = data[length:]
+            start += length
+
+    def release(self):
+        ''' Drop the staged writes '''
+        self.sectors = {}
+
+    def runs(self):
+        ''' Staged sectors sorted and coalesced into (offset, data) runs '''
+        runs = []
+        for sector in sorted(self.sectors):
+            if runs and runs[-1][0] + len(runs[-1][1]) == sector * SECTOR:
+                runs[-1][1].extend(self.sectors[sector])
+            else:
+                runs.append((sector * SECTOR, bytearray(self.sectors[sector])))
+        if runs and runs[0][0] < self.header_size:
+            # Update the MMB header with a single write
+            header = [run for run in runs if run[0] < self.header_size]
+            first = header[0][0]
+            last = header[-1][0] + len(header[-1][1])
+            runs[:len(header)] = [(first, bytearray(self[first:last]))]
+        return runs
+
+    def commit(self, filename):
+        ''' Journal the staged writes, apply them to the image and drop the journal '''
+        runs = self.runs()
+        if runs:
+            journal = filename + '.journal'
+            with image_lock(filename):
+                write_journal(journal, runs)
+                apply_runs(filename, runs)
+                os.remove(journal)
+        self.sectors = {}
+
+
+def read_sectors(image, base, position, size, interleave=False):
+    ''' Read from a disk surface, gathering the tracks of a DSD side '''
+    if not interleave:
+        return read_surface(image, base + position, size)
+    pieces = []
+    while size > 0:
+        track, within = divmod(position, TRACK_SIZE)
+        length = min(size, TRACK_SIZE - within)
+        pieces.append(read_surface(image, base + track * TRACK_SIZE * 2 + within, length))
+        if len(pieces[-1]) < length:
+            break  # Short image
+        position += length
+        size -= length
+    return pieces[0] if len(pieces) == 1 else b''.join(pieces)
+
+
+def iter_tracks(image, base, interleave=False):
+    ''' Yield a whole disk surface a track at a time '''
+    if not interleave:
+        yield read_surface(image, base, DISK_SIZE)
+        return
+    for position in range(0, DISK_SIZE, TRACK_SIZE):
+        track = read_sectors(image, base, position, TRACK_SIZE, True)
+        if not track:
+            return
+        yield track
+
+
+def write_sectors(image, base, position, data, interleave=False):
+    ''' Write to a disk surface, scattering over the tracks of a DSD side '''
+    data = memoryview(data)
+    done = 0
+    while done < len(data):
+        length = len(data) - done
+        offset = base + position + done
+        if interleave:
+            track, within = divmod(position + done, TRACK_SIZE)
+            length = min(length, TRACK_SIZE - within)
+            offset = base + track * TRACK_SIZE * 2 + within
+        if offset + length > len(image):
+            raise DFSError("Write beyond the end of the image")
+        image[offset:offset + length] = data[done:done + length]
+        done += length
+
+
+def pack_catalogue(data, entries):
+    ''' Pack (raw name, raw ext, load, exec, size, start) entries into a catalogue '''
+    data[8:0x100] = bytes(0xF8)
+    data[0x108:0x200] = bytes(0xF8)
+    for slot, (name, ext, load, exe, size, start) in enumerate(entries, 1):
+        offset = slot * 8
+        data[offset:offset + 7] = name
+        data[offset + 7] = ext
+        extra = ((start >> 8) & 3) | (((load >> 16) & 3) << 2)
+        extra |= (((size >> 16) & 3) << 4) | (((exe >> 16) & 3) << 6)
+        pack_into('<HHHBB', data, offset + 0x100, load & 0xFFFF, exe & 0xFFFF, size & 0xFFFF,
+                  extra, start & 0xFF)
+    data[0x105] = len(entries) << 3
+
+
+def free_map(disk, skip=None):
+    ''' Sector map of a disk, non zero for the catalogue and sectors in use, file skip counts as free '''
+    used = bytearray(disk['sector_count'])
+    used[0:2] = b'\x01\x01'
+    for file_index, info in enumerate(disk['file_info']):
+        if file_index == skip:
+            continue
+        end = min(info['start'] + ((info['size'] + 255) >> 8), len(used))
+        used[info['start']:end] = b'\x01' * max(end - info['start'], 0)
+    return used
+
+
+def best_fit(used, sectors):
+    ''' Start of the smallest free run of sectors big enough, None if full '''
+    best = None
+    for run in re.finditer(rb'\x00+', used):
+        length = run.end() - run.start()
+        if length >= sectors and (best is None or length < best[0]):
+            best = (length, run.start())
+    return best[1] if best else None
+
+
+@DFSStats.timed('read_catalogue')
+def read_catalogue(image, offset=0):
     ''' Read the catalogue from the disk '''
-    data = read_surface(file_p, offset, 0x200)
+    data = read_surface(image, offset, 0x200)
     disk_info = read_disk_info(data)
     if disk_info:
-        disk_info["offset"] = offset
-        file_info = []
-        for index in range(1, disk_info['file_count'] + 1):
-            file_info.insert(index, read_file_info(data, index * 8))
-        disk_info['file_info'] = file_info
+        disk_info.offset = offset
+        disk_info.file_info = [
+            read_file_info(data, index * 8) for index in range(1, disk_info.file_count + 1)
+        ]
     return disk_info
 
 
-def read_disks(filename, disk_count, offset=0):
-    ''' Read an MMB file '''
-    disk_info = []
-    if disk_count:
-        with open(filename, "rb") as file_p:
-            for _ in range(disk_count):
-                disk_info.append(read_catalogue(file_p, offset))
-                offset += DISK_SIZE
-    return disk_info
+class lru_dict(OrderedDict):
+    ''' Dict holding only the most recently used entries. size bounds the entry count,
+        or the total weight when a weigh function is given, 0 turns the cache off '''
+
+    def __init__(self, size=64, weigh=None, name=None):
+        super().__init__()
+        self.size = size
+        self.weigh = weigh
+        self.name = name
+        self.weight = 0
+        self.hits = 0
+        self.misses = 0
+        self.lock = RLock()  # The GUI export workers share one image
+
+    def __getitem__(self, key):
+        with self.lock:
+            value = super().__getitem__(key)
+            self.move_to_end(key)
+            return value
+
+    def __setitem__(self, key, value):
+        with self.lock:
+            if key in self:
+                del self[key]
+            weight = self.weigh(value) if self.weigh else 1
+            if weight > self.size:
+                return  # Would push everything else out
+            super().__setitem__(key, value)
+            self.weight += weight
+            while self.weight > self.size:
+                del self[next(iter(self))]
+
+    def __delitem__(self, key):
+        with self.lock:
+            value = super().__getitem__(key)
+            super().__delitem__(key)
+            self.weight -= self.weigh(value) if self.weigh else 1
+
+    def pop(self, key, *default):
+        with self.lock:
+            if key in self:
+                value = super().__getitem__(key)
+                del self[key]
+                return value
+        if default:
+            return default[0]
+        raise KeyError(key)
+
+    def popitem(self, last=True):
+        with self.lock:
+            key = next(reversed(self) if last else iter(self))
+            return key, self.pop(key)
+
+    def clear(self):
+        with self.lock:
+            super().clear()
+            self.weight = 0
+
+    def lookup(self, key):
+        ''' (True, value) when cached, (False, None) when not, counted as a hit or a miss '''
+        with self.lock:
+            hit = key in self
+            value = self[key] if hit else None
+        if hit:
+            self.hits += 1
+        else:
+            self.misses += 1
+        stats = DFSStats.STATS
+        if stats is not None:
+            stats.cache(hit, self.name)
+        return hit, value
+
+    def info(self):
+        ''' Hits, misses, entries and the size used of the cache '''
+        return {'hits': self.hits, 'misses': self.misses, 'entries': len(self), 'used': self.weight, 'size': self.size}
+
+
+def surface_size(image, base, interleave=False):
+    ''' Bytes iter_tracks() yields for a disk, less than DISK_SIZE for a short image '''
+    if not interleave:
+        return max(0, min(DISK_SIZE, len(image) - base))
+    size = 0
+    for position in range(0, DISK_SIZE, TRACK_SIZE):
+        available = len(image) - base - position * 2
+        if available <= 0:
+            break
+        size += min(available, TRACK_SIZE)
+        if available < TRACK_SIZE:
+            break
+    return size
+
+
+class disk_list:
+    ''' The disks of an image, each catalogue is read on first access '''
+
+    def __init__(self, image, offsets, header=None, interleave=False, cache_size=CATALOGUE_CACHE):
+        self.image = image
+        self.offsets = offsets
+        self.header = header
+        self.interleave = interleave
+        self.catalogues = lru_dict(cache_size, name='catalogue')
+        self.raw = None  # Raw catalogue sectors of every disk from a persistent cache, read instead of the image
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def __iter__(self):
+        step = max(self.catalogues.size, 1)  # A batch at a time, no more than the cache holds
+        for first in range(0, len(self.offsets), step):
+            yield from self.load_range(first, min(first + step, len(self.offsets)))
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[item] for item in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self.offsets)
+        if not 0 <= index < len(self.offsets):
+            raise IndexError("disk index out of range")
+        hit, disk = self.catalogues.lookup(index)
+        if hit:
+            return disk
+        status = self.header[index]['status'] if self.header else None
+        if status not in ('unformatted', 'invalid'):
+            if self.raw is None:
+                disk = read_catalogue(self.image, self.offsets[index])
+            else:
+                disk = self.decode([index])[0]
+            if disk:
+                disk.status = status
+        self.catalogues[index] = disk
+        return disk
+
+    def load_range(self, first, last):
+        ''' Disks first to last - 1, those not cached are read in one batch '''
+        disks = []
+        todo = []
+        for index in range(first, last):
+            hit, disk = self.catalogues.lookup(index)
+            if not hit and self.header and self.header[index]['status'] in ('unformatted', 'invalid'):
+                hit = True
+                self.catalogues[index] = None
+            disks.append(disk)
+            if not hit:
+                todo.append(index)
+        for index, disk in zip(todo, self.decode(todo)):
+            if disk and self.header:
+                disk.status = self.header[index]['status']
+            self.catalogues[index] = disk
+            disks[index - first] = disk
+        return disks
+
+    def decode(self, indexes):
+        ''' Catalogues of some disks in one batch, from the raw copies when there are some '''
+        if self.raw is None:
+            return read_catalogues(self.image, [self.offsets[index] for index in indexes])
+        disks = read_catalogues(b''.join([self.raw[index] for index in indexes]), range(0, len(indexes) * 0x200, 0x200))
+        for index, disk in zip(indexes, disks):
+            if disk:
+                disk.offset = self.offsets[index]
+        return disks
+
+    def load_all(self):
+        ''' Every catalogue, those not cached are read in one batch '''
+        return self.load_range(0, len(self.offsets))
+
+    def file_table(self):
+        ''' Flat table of (disk index, file index, file_record) for every disk '''
+        return [
+            (din, index, info)
+            for din, disk in enumerate(self) if disk
+            for index, info in enumerate(disk.file_info)
+        ]
+
+    def get_title(self, index):
+        ''' Title of a disk, from the MMB header when there is one '''
+        if self.header:
+            return self.header[index]['title']
+        return self[index]['title']
+
+
+@DFSStats.timed('read_catalogues')
+def read_catalogues(image, offsets):
+    ''' Decode the catalogues of many disks in one batch '''
+    sector0 = []
+    sector1 = []
+    for offset in offsets:
+        data = read_surface(image, offset, 0x200)
+        if len(data) < 0x200:
+            data = bytes(data).ljust(0x200, b'\x00')
+        sector0.append(data[:0x100])
+        sector1.append(data[0x100:])
+    sector0 = b''.join(sector0)
+    sector1 = b''.join(sector1)
+    names = list(iter_unpack('<7sB', sector0))
+    fields = list(iter_unpack('<HHHBB', sector1))
+    disks = []
+    for index, offset in enumerate(offsets):
+        base = index * 32
+        title2, cycle, file_count, extra, sector_count = unpack_from('<4sBBBB', sector1, base * 8)
+        sector_count += (extra & 3) << 8
+        if sector_count != 400 and sector_count != 800:
+            disks.append(None)
+            continue
+        disk = disk_record(sector0[base * 8:base * 8 + 8] + title2, cycle, file_count >> 3,
+                           (extra >> 4) & 3, sector_count, offset)
+        file_info = []
+        for slot in range(base + 1, base + disk.file_count + 1):
+            name, ext = names[slot]
+            load, exe, size, extra, start = fields[slot]
+            file_info.append(file_record(
+                name,
+                ext,
+                load + (HIGH_ADDRESS[(extra >> 2) & 3] << 16),
+                exe + (HIGH_ADDRESS[(extra >> 6) & 3] << 16),
+                size + (((extra >> 4) & 3) << 16),
+                start + ((extra & 3) << 8),
+                (slot - base) * 8,
+            ))
+        disk.file_info = file_info
+        disks.append(disk)
+    return disks
+
+
+def read_file_table(image, offsets):
+    ''' Flat table of (disk index, file index, file_record) for many disks '''
+    return [
+        (din, index, info)
+        for din, disk in enumerate(read_catalogues(image, offsets)) if disk
+        for index, info in enumerate(disk.file_info)
+    ]
 
 
-def read_ssd(filename):
+def read_disks(image, disk_count, offset=0, header=None):
+    ''' Catalogues of consecutive disks '''
+    return disk_list(image, [offset + index * DISK_SIZE for index in range(disk_count or 0)], header)
+
+
+def read_ssd(image):
     ''' Read in a SSD Image '''
-    disk_count = 1 if os.path.getsize(filename) < (DISK_SIZE + 0x200) else 2
-    return read_disks(filename, disk_count)
+    disk_count = 1 if len(image) < (DISK_SIZE + 0x200) else 2
+    return read_disks(image, disk_count)
+
+
+def read_dsd(image):
+    ''' Read in a DSD Image, the sides are read in place without conversion '''
+    return disk_list(image, [0, TRACK_SIZE][:1 if len(image) <= TRACK_SIZE else 2], interleave=True)
+
 
+@DFSStats.timed('read_mmb_header')
+def read_mmb_header(image, disk_count):
+    ''' Read the title and status of each DIN from the MMB header '''
+    data = read_surface(image, 0, MMB_HEADER)
+    header = []
+    for din in range(disk_count):
+        title, status = unpack_from('12s3xB', data, (din + 1) * 16)
+        header.append(header_record(title, MMB_STATUS.get(status, 'invalid')))
+    return header
 
-def get_disk_count(filename):
+
+def get_disk_count(image):
     ''' Calculate the number of disks in an MMB '''
-    size = os.path.getsize(filename)
+    size = len(image)
     if size >= MMB_HEADER:
         size -= MMB_HEADER
         disk_count, rem = divmod(size, DISK_SIZE)
         if rem:
-            print("MMB is oversize by {rem} bytes")
+            print(f"MMB is oversize by {rem} bytes", file=sys.stderr)
         if disk_count and (disk_count <= 511):
             return disk_count
     return None
 
 
-def read_mmb(filename):
-    ''' Read an MMB file '''
-    return read_disks(filename, get_disk_count(filename), MMB_HEADER)
-
-def convert_dsd(filename):
-    ''' Convert an DSD Iamge to a Double Sided SSD Image '''
-    if os.path.getsize(filename) == 0x64000:
-        with open(filename, "rb") as file_p:
-            data = file_p.read()
-            side0 = bytes()
-            side1 = bytes()
-            offset = 0
-            for _ in range(80):
-                side0 += data[offset:offset + 0xA00]
-                offset += 0xA00
-                side1 += data[offset:offset + 0xA00]
-                offset += 0xA00
-        new_name = filename.replace('.dsd', '.ssd')
-        with open(new_name, "wb") as file_p:
-            file_p.write(side0 + side1)
-        return new_name
-    else:
-        raise "Wrong Size"
-    return None
+def read_mmb(image):
+    ''' Read an MMB file, only the header is read until a disk is accessed '''
+    disk_count = get_disk_count(image)
+    if not disk_count:
+        return read_disks(image, 0)
+    return read_disks(image, disk_count, MMB_HEADER, read_mmb_header(image, disk_count))
+
+
+def convert_dsd(filename, new_name=None):
+    ''' Export a DSD Image to a Double Sided SSD Image, a track at a time '''
+    if new_name is None:
+        new_name = os.path.splitext(filename)[0] + '.ssd'
+    with acorn_dfs(filename) as image, open(new_name, "wb") as file_p:
+        for side in image.disk_info.offsets:
+            for track in iter_tracks(image.view, side, True):
+                file_p.write(track)
+    return new_name
+
+
+def copy_range(src, dst, count, src_offset, dst_offset):
+    ''' Copy between files inside the kernel where possible, returns bytes copied '''
+    done = 0
+    if hasattr(os, 'copy_file_range'):
+        try:
+            while done < count:
+                length = os.copy_file_range(src, dst, count - done, src_offset + done, dst_offset + done)
+                if not length:
+                    return done
+                done += length
+            return done
+        except OSError:
+            pass  # Not supported between these files, fall back
+    if hasattr(os, 'sendfile') and hasattr(os, 'pread') and os.name == 'posix':
+        try:
+            os.lseek(dst, dst_offset + done, os.SEEK_SET)
+            while done < count:
+                length = os.sendfile(dst, src, src_offset + done, count - done)
+                if not length:
+                    return done
+                done += length
+            return done
+        except OSError:
+            pass
+    while done < count:
+        os.lseek(src, src_offset + done, os.SEEK_SET)
+        data = os.read(src, min(count - done, 0x10000))
+        if not data:
+            break
+        os.lseek(dst, dst_offset + done, os.SEEK_SET)
+        os.write(dst, data)
+        done += len(data)
+    return done
+
+
+def image_sides(filename):
+    ''' (filename, offset, interleave) for each disk held in an SSD or DSD file '''
+    size = os.path.getsize(filename)
+    if os.path.splitext(filename)[1].lower() == '.dsd':
+        return [(filename, offset, True) for offset in [0, TRACK_SIZE][:1 if size <= TRACK_SIZE else 2]]
+    return [(filename, offset, False) for offset in [0, DISK_SIZE][:1 if size < DISK_SIZE + 0x200 else 2]]
+
+
+def build_mmb(ssd_paths, out):
+    ''' Build an MMB from SSD and DSD images, each side of a DSD gets its own DIN '''
+    sides = [side for filename in ssd_paths for side in image_sides(filename)]
+    if len(sides) > 511:
+        raise DFSError(f"{len(sides)} disks will not fit in an MMB")
+    header = bytearray(MMB_HEADER)
+    header[0:4] = bytes(min(drive, max(len(sides) - 1, 0)) for drive in range(4))
+    for din in range(511):
+        header[(din + 1) * 16 + 15] = 0xF0 if din < len(sides) else 0xFF
+    with open(out, "w+b") as out_p:
+        out_p.truncate(MMB_HEADER + len(sides) * DISK_SIZE)  # Unused space reads as zero
+        for din, (filename, offset, interleave) in enumerate(sides):
+            base = MMB_HEADER + din * DISK_SIZE
+            with open(filename, "rb") as in_p:
+                catalogue = read_surface(in_p, offset, 0x200)
+                if interleave:
+                    for position in range(0, DISK_SIZE, TRACK_SIZE):
+                        track = offset + position * 2
+                        length = copy_range(in_p.fileno(), out_p.fileno(), TRACK_SIZE, track, base + position)
+                        if length < TRACK_SIZE:
+                            break
+                else:
+                    copy_range(in_p.fileno(), out_p.fileno(), DISK_SIZE, offset, base)
+            if len(catalogue) == 0x200:
+                entry = (din + 1) * 16
+                header[entry:entry + 8] = catalogue[0:8]
+                header[entry + 8:entry + 12] = catalogue[0x100:0x104]
+                header[entry + 15] = 0x0F
+        pwrite(out_p, header, 0)
+    return len(sides)
 
 
 class acorn_dfs:
     ''' Wrap the DFS Methods in a class '''
+    image = None
+    view = None
+    disk_info = None
+    filename = None
+    cache = None
+    writable = False
+    catalogue_size = CATALOGUE_CACHE
+    sectors = None
 
-    def __init__(self, filename=None):
+    def __init__(self, filename=None, cache=None, writable=False, catalogues=CATALOGUE_CACHE, sector_bytes=SECTOR_CACHE):
         ''' Open an parse the directories of a DFS File '''
-        self.open_image(filename)
+        self.cache = cache
+        self.catalogue_size = catalogues
+        self.sectors = lru_dict(sector_bytes, len, 'sector')
+        self.open_image(filename, writable)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_args):
+        self.close()
 
-    def open_image(self, filename=None):
-        ''' release a file (It is not open at this point)'''
+    def close(self):
+        ''' Release the mapping of the current image '''
         self.disk_info = None
+        if self.sectors is not None:
+            self.sectors.clear()
+        if self.view is not None:
+            self.view.release()
+            self.view = None
+        if self.image is not None:
+            if self.writable:
+                self.image.flush()
+            try:
+                self.image.close()
+            except BufferError:
+                pass  # Slices are still in use, the map closes when they go
+            self.image = None
+
+    def cache_info(self):
+        ''' Hits, misses and use of the catalogue and sector caches '''
+        info = {}
+        if self.disk_info is not None:
+            info['catalogue'] = self.disk_info.catalogues.info()
+        if self.sectors is not None:
+            info['sector'] = self.sectors.info()
+        return info
+
+    @property
+    def stats(self):
+        ''' The active DFSStats.io_stats, None unless instrumentation is enabled '''
+        return DFSStats.STATS
+
+    @DFSStats.timed('open_image')
+    def open_image(self, filename=None, writable=False):
+        ''' Map a new image, releasing the previous one '''
+        self.close()
+        self.filename = filename
+        self.writable = writable
         if filename:
             extension = os.path.splitext(filename)[1].lower()
-            if extension == '.ssd':
-                self.disk_info = read_ssd(filename)
-            elif extension == '.dsd':
-                filename = convert_dsd(filename)
-                self.disk_info = read_ssd(filename)
-            elif extension == '.mmb':
-                self.disk_info = read_mmb(filename)
-        self.filename = filename
+            if extension in ('.ssd', '.dsd', '.mmb'):
+                if writable:
+                    recover_journal(filename)  # Readers leave a journal to the writers
+                self.image, self.view = map_image(filename, writable)
+                if extension == '.ssd':
+                    self.disk_info = read_ssd(self.view)
+                elif extension == '.dsd':
+                    self.disk_info = read_dsd(self.view)
+                else:
+                    self.disk_info = read_mmb(self.view)
+                self.disk_info.catalogues.size = self.catalogue_size
+                if self.cache and self.disk_info:
+                    self.cache.load(self)
         return filename
 
     def get_default_name(self, base_name):
@@ -191,7 +983,7 @@ class acorn_dfs:
 
     def get_disk_title(self, index=0):
         ''' Get the title of one of the disks '''
-        return self.disk_info[index]['title']
+        return self.disk_info.get_title(index)
 
     def write_ssd(self, index, filename=None):
         ''' Write SSD from an MMB '''
@@ -199,21 +991,41 @@ class acorn_dfs:
             disk = self.disk_info[index]
             if filename is None:
                 filename = self.get_default_name(f"DIN_{index}_{disk['title']}.ssd")
-            with open(self.filename, "rb") as file_p:
-                data = read_surface(file_p, disk['offset'], DISK_SIZE)
-                with open(filename, 'wb') as file_p:
-                    file_p.write(data)
+            with open(filename, 'wb') as file_p:
+                for track in iter_tracks(self.view, disk['offset'], self.disk_info.interleave):
+                    file_p.write(track)
 
+    def read_disk(self, disk_index, position, size):
+        ''' Read from the surface of one disk, copies are kept in the sector cache '''
+        disk = self.disk_info[disk_index]
+        if self.sectors is None or (isinstance(self.view, memoryview) and not self.disk_info.interleave):
+            # Slices of a mapping cost nothing to make again
+            return read_sectors(self.view, disk['offset'], position, size, self.disk_info.interleave)
+        key = (disk_index, position, size)
+        hit, data = self.sectors.lookup(key)
+        if not hit:
+            data = read_sectors(self.view, disk['offset'], position, size, self.disk_info.interleave)
+            self.sectors[key] = data
+        return data
+
+    def write_disk(self, disk_index, position, data):
+        ''' Write to the surface of one disk, only the bytes given are touched '''
+        if not self.writable:
+            raise DFSError("Image is not open for writing")
+        disk = self.disk_info[disk_index]
+        write_sectors(self.view, disk['offset'], position, data, self.disk_info.interleave)
+        self.disk_info.raw = None  # The catalogues are read from the image from now on
+        if self.sectors:
+            for key in [key for key in self.sectors if key[0] == disk_index]:
+                del self.sectors[key]
+
+    @DFSStats.timed('get_data')
     def get_data(self, disk_index, file_index):
-        ''' Write a file from an SSD to disk '''
+        ''' Write a file from an SSD to disk, never reading past the end of the disk '''
         disk = self.disk_info[disk_index]
         info = disk['file_info'][file_index]
-        offset = disk["offset"] + (info["start"] * 256)
-        size = info["size"]
-        with open(self.filename, "rb") as read_p:
-            data = read_surface(read_p, offset, size)
-            return data, info['name']
-        return None, None
+        size = max(min(info["size"], (disk['sector_count'] - info["start"]) * 256), 0)
+        return self.read_disk(disk_index, info["start"] * 256, size), info['name']
 
     def write_file(self, disk_index, file_index, filename=None):
         ''' Write a file from an SSD to disk '''
@@ -233,6 +1045,217 @@ class acorn_dfs:
             with open(filename, 'wb') as write_p:
                 Decode(data, write_p)
 
+    def extract_disk(self, index, dest_dir, basic=False):
+        ''' Write every file of a disk with a .inf file, returns (disk, file, path, error) '''
+        results = []
+        try:
+            disk = self.disk_info[index]
+            if not disk:
+                return results
+            disk_dir = os.path.join(dest_dir, host_name(f"DIN_{index:03d}_{disk['title']}"))
+            os.makedirs(disk_dir, exist_ok=True)
+            file_info = disk['file_info']
+        except Exception as error:
+            return [(index, None, None, f"Bad catalogue: {error}")]
+        for file_index, info in enumerate(file_info):
+            path = os.path.join(disk_dir, host_name(f"{info['ext']}.{info['name']}"))
+            try:
+                data, _name = self.get_data(index, file_index)
+                if len(data) < info['size']:
+                    raise DFSError(f"Runs past the end of the disk at sector {disk['sector_count']:03X}")
+                with open(path, "wb") as write_p:
+                    write_p.write(data)
+                with open(path + ".inf", "w") as write_p:
+                    write_p.write(
+                        f"{info['ext']}.{info['name']} {info['load_&']:06X} {info['exec_&']:06X} "
+                        f"{info['size']:06X}{' Locked' if info['lock'] == 'L' else ''}\n"
+                    )
+                if basic and is_basic(data):
+                    with open(path + ".bas", "wb") as write_p:
+                        Decode(data, write_p)
+                results.append((index, file_index, path, None))
+            except Exception as error:
+                results.append((index, file_index, path, str(error)))
+        return results
+
+    def extract_all(self, dest_dir, workers=None, basic=False):
+        ''' Extract every disk and file, spreading ranges of disks over processes '''
+        disk_count = len(self.disk_info)
+        workers = min(workers or os.cpu_count() or 1, disk_count)
+        if workers <= 1:
+            results = []
+            for index in range(disk_count):
+                results.extend(self.extract_disk(index, dest_dir, basic))
+            return results
+        step = -(-disk_count // (workers * 4))
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            jobs = [
+                pool.submit(extract_range, self.filename, first, min(first + step, disk_count), dest_dir, basic)
+                for first in range(0, disk_count, step)
+            ]
+            return [result for job in jobs for result in job.result()]
+
+    @contextmanager
+    def batch(self):
+        ''' Stage every write in the block, then commit them together through a journal '''
+        if not self.writable:
+            raise DFSError("Image is not open for writing")
+        if isinstance(self.view, staged_writes):
+            raise DFSError("Already in a batch")
+        view = self.view
+        staged = staged_writes(view, MMB_HEADER if self.disk_info.header else 0)
+        self.view = self.disk_info.image = staged
+        try:
+            yield self
+            staged.commit(self.filename)
+        finally:
+            staged.release()
+            self.view = self.disk_info.image = view
+            self.disk_info.catalogues.clear()
+            if self.sectors is not None:
+                self.sectors.clear()
+            if self.disk_info.header:
+                self.disk_info.header = read_mmb_header(view, len(self.disk_info))
+
+    def write_header(self, disk_index, title=None, status=None):
+        ''' Update the MMB header entry of a disk '''
+        if self.disk_info.header:
+            offset = (disk_index + 1) * 16
+            if title is not None:
+                self.view[offset:offset + 12] = to_acorn(title, 12, b'\x00')
+                self.disk_info.header[disk_index]['title'] = title
+            if status is not None:
+                code = {value: key for key, value in MMB_STATUS.items()}[status]
+                self.view[offset + 15:offset + 16] = bytes([code])
+                self.disk_info.header[disk_index]['status'] = status
+
+    def set_title(self, disk_index, title):
+        ''' Change the title of a disk '''
+        data = to_acorn(title, 12, b'\x00')
+        catalogue = bytearray(self.read_disk(disk_index, 0, 0x200))
+        catalogue[0:8] = data[:8]
+        catalogue[0x100:0x104] = data[8:]
+        catalogue[0x104] = next_cycle(catalogue[0x104])
+        self.write_disk(disk_index, 0, catalogue)
+        self.write_header(disk_index, title=title)
+        self.disk_info.catalogues.pop(disk_index, None)
+
+    def set_boot(self, disk_index, option):
+        ''' Change the *OPT 4 boot option of a disk '''
+        catalogue = bytearray(self.read_disk(disk_index, 0x100, 0x100))
+        catalogue[6] = (catalogue[6] & 0xCF) | ((option & 3) << 4)
+        self.write_disk(disk_index, 0x100, catalogue)
+        self.disk_info.catalogues.pop(disk_index, None)
+
+    def lock_disk(self, disk_index, locked=True):
+        ''' Lock or unlock a disk in the MMB header '''
+        if not self.writable:
+            raise DFSError("Image is not open for writing")
+        self.write_header(disk_index, status='locked' if locked else 'unlocked')
+        self.disk_info.catalogues.pop(disk_index, None)
+
+    def write_catalogue(self, disk_index, entries):
+        ''' Rewrite the catalogue of a disk from (raw name, raw ext, load, exec, size, start) '''
+        if len(entries) > 31:
+            raise DFSError("Catalogue full")
+        data = bytearray(self.read_disk(disk_index, 0, 0x200))
+        pack_catalogue(data, sorted(entries, key=lambda entry: entry[5], reverse=True))
+        data[0x104] = next_cycle(data[0x104])
+        self.write_disk(disk_index, 0, data)
+        self.disk_info.catalogues.pop(disk_index, None)  # Read again when next used
+
+    def get_entries(self, disk_index):
+        ''' Catalogue entries of a disk as (raw name, raw ext, load, exec, size, start) '''
+        return [
+            [info.raw_name, info.raw_ext, info.load_addr, info.exec_addr, info.size, info.start]
+            for info in self.disk_info[disk_index]['file_info']
+        ]
+
+    def find_file(self, disk_index, name, ext='$'):
+        ''' Index of a file in a catalogue, None if it is not there '''
+        for file_index, info in enumerate(self.disk_info[disk_index]['file_info']):
+            if info['name'].upper() == name.upper() and info['ext'].upper() == ext.upper():
+                return file_index
+        return None
+
+    def add_file(self, disk_index, name, data, load=0, exec_addr=0, ext='$', locked=False):
+        ''' Save a file into the best fitting free space, replacing one of the same name '''
+        raw_name = to_acorn(name, 7)
+        raw_ext = to_acorn(ext, 1)[0] | (0x80 if locked else 0)
+        old = self.find_file(disk_index, name, ext)
+        entries = self.get_entries(disk_index)
+        if old is not None:
+            if entries[old][1] & 0x80:
+                raise DFSError("File locked")
+            del entries[old]  # Dropped from the catalogue when the new data is written
+        if len(entries) >= 31:
+            raise DFSError("Catalogue full")
+        disk = self.disk_info[disk_index]
+        sectors = max((len(data) + 255) >> 8, 1)
+        start = best_fit(free_map(disk), sectors)
+        in_place = start is None and old is not None
+        if in_place:
+            # Only fits over the old file, journal it so the old file survives a failure
+            start = best_fit(free_map(disk, old), sectors)
+        if start is None:
+            raise DFSError("Disk full")
+        entries.append([raw_name, raw_ext, load, exec_addr, len(data), start])
+        with self.batch() if in_place and not isinstance(self.view, staged_writes) else nullcontext():
+            self.write_disk(disk_index, start * 256, data)
+            self.write_catalogue(disk_index, entries)
+        return self.find_file(disk_index, name, ext)
+
+    def delete_file(self, disk_index, file_index):
+        ''' Remove a file from the catalogue, the sectors become free space '''
+        entries = self.get_entries(disk_index)
+        if entries[file_index][1] & 0x80:
+            raise DFSError("File locked")
+        del entries[file_index]
+        self.write_catalogue(disk_index, entries)
+
+    def rename_file(self, disk_index, file_index, name, ext=None):
+        ''' Rename a file, optionally moving it to another directory '''
+        entries = self.get_entries(disk_index)
+        if entries[file_index][1] & 0x80:
+            raise DFSError("File locked")
+        info = self.disk_info[disk_index]['file_info'][file_index]
+        ext = info['ext'] if ext is None else ext
+        other = self.find_file(disk_index, name, ext)
+        if other is not None and other != file_index:
+            raise DFSError("File exists")
+        entries[file_index][0] = to_acorn(name, 7)
+        entries[file_index][1] = to_acorn(ext, 1)[0] | (entries[file_index][1] & 0x80)
+        self.write_catalogue(disk_index, entries)
+
+    def lock_file(self, disk_index, file_index, locked=True):
+        ''' Set or clear the lock flag of a file '''
+        entries = self.get_entries(disk_index)
+        entries[file_index][1] = (entries[file_index][1] & 0x7F) | (0x80 if locked else 0)
+        self.write_catalogue(disk_index, entries)
+
+    def compact(self, disk_index):
+        ''' Close the gaps between files, only the files that have to move are copied '''
+        entries = sorted(self.get_entries(disk_index), key=lambda entry: entry[5])
+        next_free = 2
+        moved = False
+        for entry in entries:
+            if entry[5] < next_free:
+                raise DFSError("Files overlap, check the disk first")
+            if entry[5] != next_free:
+                data = bytes(self.read_disk(disk_index, entry[5] * 256, entry[4]))
+                self.write_disk(disk_index, next_free * 256, data)
+                entry[5] = next_free
+                moved = True
+            next_free += (entry[4] + 255) >> 8
+        if moved:
+            self.write_catalogue(disk_index, entries)
+        return moved
+
+    def iter_basic(self, disk_index, file_index):
+        ''' Yield (line number, text) from a BASIC program one line at a time '''
+        data, _name = self.get_data(disk_index, file_index)
+        return iter_lines(data)
+
     def get_md5(self, disk_index, file_index):
         ''' Get the MD5 Sum '''
         data, _filename = self.get_data(disk_index, file_index)
@@ -259,4 +1282,6 @@ if __name__ == "__main__":
     # pad_disk("WatfordROMram.ssd")
     # acorn_dfs('BEEB.mmb').show_catalogue()
     # acorn_dfs("ROMs1.ssd").show_catalogue()
-    acorn_dfs("PCBCAD.ssd").show_catalogue()
+    # acorn_dfs("PCBCAD.ssd").show_catalogue()
+    from DFS_CLI import cli
+    sys.exit(cli())
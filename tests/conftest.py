@@ -0,0 +1,5 @@
+''' The modules live flat in src, as they do when run from there '''
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
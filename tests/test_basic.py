@@ -0,0 +1,69 @@
+''' Tokenise and Decode round trips '''
+import io
+import random
+
+import pytest
+
+from BBCBasicToText import BASIC2_TABLE, Decode, Detokenise, ReadHeaders, Tokenise, iter_lines
+from DFS_Bench import make_listing
+
+LISTINGS = {
+    'goto': b'10 GOTO 100\r20 GOSUB 1000:RETURN\r30 IF X>10 THEN 200 ELSE 300\r40 RESTORE 500\r',
+    'on goto': b'10 ON X GOTO 100,200,300\r20 ON ERROR GOTO 40\r30 ON Y GOSUB 1000,2000 ELSE 50\r',
+    'rem': b'10 REM GOTO 100 PRINT "no\r20 REM\r30 A=1:REM TIME PAGE\r',
+    'data': b'10 DATA 1,2,PRINT,"GOTO 10",THEN\r20 READ A$:DATA TIME\r',
+    'strings': b'10 PRINT "PRINT GOTO 10";A$\r20 A$="":B$="""":C$="PAGE=TIME"\r30 PRINT "unterminated\r',
+    'pseudo variables': (
+        b'10 PAGE=&1900:A=PAGE\r20 TIME=0:T=TIME\r30 HIMEM=LOMEM+&100:PTR#F=PTR#F+1\r'
+        b'40 IF X THEN TIME=0 ELSE LOMEM=TOP\r50 PRINT PAGE,TIME,HIMEM,LOMEM,PTR#F\r'),
+    'conditional keywords': b'10 TRUEX=1:ENDX=2:FALSEY=TRUE\r20 PRINT TRUEX,ENDX,FALSEY,TRUE\r30 TOPX=TOP\r',
+    'star commands': b'10 *FX 200,3\r20 A=1:*KEY0 PRINT GOTO 10|M\r30 IF X *TV 255\r40 OSCLI "CAT"\r',
+    'procedures': (
+        b'10 PROCdraw(X,Y):A$=FNname(LEFT$(B$,3))\r20 PROCPRINT:PROCGOTO\r'
+        b'30 DEFPROCdraw(X,Y)\r40 ENDPROC\r50 DEFFNname(A$)=A$+"."\r'),
+}
+
+
+def decode(program, **options):
+    output = io.BytesIO()
+    Decode(program, output, **options)
+    return output.getvalue()
+
+
+@pytest.mark.parametrize('listing', LISTINGS.values(), ids=LISTINGS.keys())
+def test_round_trip(listing):
+    assert decode(Tokenise(listing)) == listing
+
+
+@pytest.mark.parametrize('listing', LISTINGS.values(), ids=LISTINGS.keys())
+def test_round_trip_basic2(listing):
+    text = b''.join(b'%d %s\r' % (number, Detokenise(line, BASIC2_TABLE))
+                    for number, line in ReadHeaders(Tokenise(listing, BASIC2_TABLE)))
+    assert text == listing
+
+
+def test_iter_lines_matches_decode():
+    listing = b''.join(LISTINGS.values())  # Line numbers need not be in order
+    program = Tokenise(listing)
+    assert b''.join(b'%d %s\r' % line for line in iter_lines(program)) == decode(program)
+    assert list(iter_lines(io.BytesIO(program))) == list(iter_lines(program))
+
+
+def test_random_listings():
+    rng = random.Random(1)
+    for _ in range(20):
+        listing = make_listing(rng, 2000)
+        assert decode(Tokenise(listing)) == listing
+
+
+def test_line_numbers_are_tokens():
+    program = Tokenise(LISTINGS['on goto'])
+    assert b'\x8d' in program and b'100' not in program
+    assert decode(program, use_line_numbers=False).split(b'\r')[0] == b'ON X GOTO 100,200,300'
+
+
+def test_pseudo_variable_tokens():
+    ''' The set token at the start of a statement, the get token anywhere else '''
+    program = Tokenise(b'10 PAGE=&1900:A=PAGE:TIME=TIME\r')
+    assert program[4:-2] == b'\xd0=&1900:A=\x90:\xd1=\x91'
+    assert Tokenise(b'10 TRUEX=1\r')[4:-2] == b'TRUEX=1'  # A conditional keyword in a name
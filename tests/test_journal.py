@@ -0,0 +1,103 @@
+''' Batched writes: staging, commit, rollback and replay of the journal '''
+import random
+from pathlib import Path
+
+import pytest
+
+import PyAcornDFS
+from DFS_Bench import make_mmb
+from PyAcornDFS import MMB_HEADER, SECTOR, acorn_dfs, staged_writes, write_journal
+
+
+@pytest.fixture
+def mmb(tmp_path):
+    filename = str(tmp_path / 'TEST.mmb')
+    with open(filename, 'wb') as file_p:
+        file_p.write(make_mmb(random.Random(1), 4, 3))
+    return filename
+
+
+def read(filename):
+    with open(filename, 'rb') as file_p:
+        return file_p.read()
+
+
+def journal_of(filename):
+    return Path(filename + '.journal')
+
+
+def test_runs_coalesce_sectors_and_header():
+    view = bytearray(MMB_HEADER + 8 * SECTOR)
+    staged = staged_writes(view, MMB_HEADER)
+    staged[0x20:0x22] = b'AB'
+    staged[0x1F00:0x1F01] = b'C'
+    staged[MMB_HEADER + 2 * SECTOR:MMB_HEADER + 4 * SECTOR] = b'D' * 2 * SECTOR
+    staged[MMB_HEADER + 5 * SECTOR + 1:MMB_HEADER + 5 * SECTOR + 2] = b'E'
+    assert view == bytearray(len(view))  # Nothing reaches the image before commit
+    runs = staged.runs()
+    # The two header sectors become one write of everything between them
+    assert [(offset, len(data)) for offset, data in runs] == [
+        (0, MMB_HEADER), (MMB_HEADER + 2 * SECTOR, 2 * SECTOR), (MMB_HEADER + 5 * SECTOR, SECTOR)]
+    assert runs[0][1][0x20:0x22] == b'AB' and runs[0][1][0x1F00:0x1F01] == b'C'
+    assert staged[0x1F00:0x1F02] == b'C\x00'
+
+
+def test_commit(mmb):
+    with acorn_dfs(mmb, writable=True) as image:
+        with image.batch():
+            image.set_title(1, 'RENAMED')
+            image.rename_file(2, 0, 'NEWNAME')
+            assert image.disk_info[2]['file_info'][0]['name'] == 'NEWNAME'
+        assert image.disk_info.header[1]['title'] == 'RENAMED'
+    with acorn_dfs(mmb) as image:
+        assert image.get_disk_title(1) == 'RENAMED'
+        assert image.disk_info[1]['title'] == 'RENAMED'
+        assert image.find_file(2, 'NEWNAME') is not None
+    assert not journal_of(mmb).exists()
+
+
+def test_rollback(mmb):
+    before = read(mmb)
+    with acorn_dfs(mmb, writable=True) as image:
+        with pytest.raises(RuntimeError):
+            with image.batch():
+                image.delete_file(0, 0)
+                assert image.disk_info[0]['file_count'] == 2
+                raise RuntimeError("give up")
+        assert image.disk_info[0]['file_count'] == 3
+    assert read(mmb) == before
+    assert not journal_of(mmb).exists()
+
+
+def test_replay_interrupted_commit(mmb, monkeypatch):
+    def power_cut(_filename, _runs):
+        raise OSError("power cut")
+
+    before = read(mmb)
+    with monkeypatch.context() as patch:
+        patch.setattr(PyAcornDFS, 'apply_runs', power_cut)  # The journal is written, the image is not
+        with acorn_dfs(mmb, writable=True) as image:
+            with pytest.raises(OSError):
+                with image.batch():
+                    image.set_title(3, 'REPLAYED')
+    assert read(mmb) == before
+    assert journal_of(mmb).exists()
+    with acorn_dfs(mmb) as image:  # A reader leaves the journal for the next writer
+        assert image.get_disk_title(3) != 'REPLAYED'
+    assert read(mmb) == before
+    assert journal_of(mmb).exists()
+    with acorn_dfs(mmb, writable=True) as image:
+        assert image.get_disk_title(3) == 'REPLAYED'
+        assert image.disk_info[3]['title'] == 'REPLAYED'
+    assert not journal_of(mmb).exists()
+
+
+def test_unfinished_journal_is_dropped(mmb):
+    before = read(mmb)
+    write_journal(mmb + '.journal', [(MMB_HEADER, b'X' * SECTOR)])
+    journal = journal_of(mmb)
+    journal.write_bytes(journal.read_bytes()[:-1])  # Cut short before the CRC was written
+    with acorn_dfs(mmb, writable=True) as image:
+        assert image.disk_info[0]['file_count'] == 3
+    assert read(mmb) == before
+    assert not journal.exists()
@@ -0,0 +1,97 @@
+''' DFSServer against its own loopback client '''
+import asyncio
+import json
+import random
+
+import pytest
+
+from DFS_Bench import make_mmb, make_ssd
+from DFSServer import dfs_server, fetch
+from PyAcornDFS import DISK_SIZE, MMB_HEADER, acorn_dfs
+
+
+@pytest.fixture
+def mmb(tmp_path):
+    filename = str(tmp_path / 'TEST.mmb')
+    with open(filename, 'wb') as file_p:
+        file_p.write(make_mmb(random.Random(2), 3, 4))
+    return filename
+
+
+def serve(filename, *requests):
+    ''' (status, headers, body) of each (path, headers) request, made in turn '''
+
+    async def run():
+        server = dfs_server(filename)
+        listener = await server.serve('127.0.0.1', 0)
+        port = listener.sockets[0].getsockname()[1]
+        try:
+            return [await fetch('127.0.0.1', port, path, headers) for path, headers in requests]
+        finally:
+            listener.close()
+            await listener.wait_closed()
+            server.close()
+
+    return asyncio.run(run())
+
+
+def test_list_disks(mmb):
+    [(status, headers, body)] = serve(mmb, ('/', None))
+    assert status == 200
+    assert headers['content-type'] == 'application/json'
+    document = json.loads(body)
+    assert [disk['din'] for disk in document['disks']] == [0, 1, 2]
+    assert document['disks'][1]['title'] == 'DIN1'
+
+
+def test_disk_as_ssd(mmb):
+    with open(mmb, 'rb') as file_p:
+        expected = file_p.read()[MMB_HEADER + DISK_SIZE:MMB_HEADER + 2 * DISK_SIZE]
+    [(status, headers, body)] = serve(mmb, ('/1.ssd', None))
+    assert status == 200
+    assert headers['accept-ranges'] == 'bytes'
+    assert body == expected
+
+
+def test_range(mmb):
+    [(status, headers, whole), (partial, range_headers, part), (suffix, _headers, tail)] = serve(
+        mmb, ('/2/0', None), ('/2/0', {'Range': 'bytes=16-31'}), ('/2.ssd', {'Range': 'bytes=-256'}))
+    assert status == 200
+    assert partial == 206 and suffix == 206
+    assert range_headers['content-range'] == f"bytes 16-31/{len(whole)}"
+    assert part == whole[16:32]
+    assert len(tail) == 256
+
+
+def test_not_found(mmb):
+    responses = serve(mmb, ('/9', None), ('/0/NOFILE', None), ('/nothing', None))
+    assert [status for status, _headers, _body in responses] == [404, 404, 404]
+
+
+def test_file_stops_at_end_of_disk(tmp_path):
+    data = bytearray(make_mmb(random.Random(2), 3, 4))
+    entry = MMB_HEADER + 0x108  # Sector 1 of the first file on DIN 0
+    data[entry + 4:entry + 6] = (0x3000).to_bytes(2, 'little')
+    data[entry + 6] = (data[entry + 6] & 0xCC) | 0x03  # Start &31F, the last sector
+    data[entry + 7] = 0x1F
+    filename = str(tmp_path / 'CORRUPT.mmb')
+    with open(filename, 'wb') as file_p:
+        file_p.write(data)
+    [(status, headers, body)] = serve(filename, ('/0/0', None))
+    assert status == 200
+    assert int(headers['content-length']) == len(body) == 256
+    assert body == data[MMB_HEADER + 0x31F * 256:MMB_HEADER + DISK_SIZE]
+
+
+def test_file_stops_at_end_of_image(tmp_path):
+    filename = str(tmp_path / 'SHORT.ssd')
+    with open(filename, 'wb') as file_p:
+        file_p.write(make_ssd(random.Random(3), 'SHORT', 4)[:0x1000])
+    with acorn_dfs(filename) as image:
+        file_info = image.disk_info[0]['file_info']
+        expected = [bytes(image.get_data(0, index)[0]) for index in range(len(file_info))]
+        assert any(len(data) < info.size for data, info in zip(expected, file_info))
+    responses = serve(filename, *[(f'/0/{index}', None) for index in range(len(expected))])
+    assert [body for _status, _headers, body in responses] == expected
+    for _status, headers, body in responses:
+        assert int(headers['content-length']) == len(body)
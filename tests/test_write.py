@@ -0,0 +1,141 @@
+''' In-place add, delete, rename, lock and compact '''
+import random
+
+import pytest
+
+from DFS_Bench import make_dsd, make_ssd
+from PyAcornDFS import DFSError, acorn_dfs, free_map
+
+
+@pytest.fixture
+def ssd(tmp_path):
+    ''' An empty 800 sector disk '''
+    filename = str(tmp_path / 'TEST.ssd')
+    with open(filename, 'wb') as file_p:
+        file_p.write(make_ssd(random.Random(1), 'TEST', 0))
+    return filename
+
+
+def read(filename):
+    with open(filename, 'rb') as file_p:
+        return file_p.read()
+
+
+def start_of(image, name):
+    return image.disk_info[0]['file_info'][image.find_file(0, name)]['start']
+
+
+def contents(image, name):
+    return bytes(image.get_data(0, image.find_file(0, name))[0])
+
+
+def fill(image):
+    ''' Use every free sector that is left '''
+    image.add_file(0, 'FILL', b'F' * free_map(image.disk_info[0]).count(0) * 256)
+
+
+def test_best_fit(ssd):
+    with acorn_dfs(ssd, writable=True) as image:
+        for name, sectors in (('A', 4), ('B', 2), ('C', 10), ('D', 1), ('E', 3)):
+            image.add_file(0, name, name.encode() * sectors * 256)
+        assert [start_of(image, name) for name in 'ABCDE'] == [2, 6, 8, 18, 19]
+        image.delete_file(0, image.find_file(0, 'B'))
+        image.delete_file(0, image.find_file(0, 'D'))
+        image.add_file(0, 'ONE', b'1' * 200)
+        image.add_file(0, 'TWO', b'2' * 512)
+        image.add_file(0, 'THREE', b'3' * 768)
+        assert [start_of(image, name) for name in ('ONE', 'TWO', 'THREE')] == [18, 6, 22]
+
+
+def test_replace_keeps_old_data_until_written(ssd):
+    with acorn_dfs(ssd, writable=True) as image:
+        image.add_file(0, 'REN', b'old' * 170, load=0x1900)
+        old_start = start_of(image, 'REN')
+        image.add_file(0, 'REN', b'new' * 170, load=0x3000)
+        assert image.disk_info[0]['file_count'] == 1
+        assert start_of(image, 'REN') != old_start  # Free space is used before the old file
+        assert bytes(image.read_disk(0, old_start * 256, 3)) == b'old'
+    with acorn_dfs(ssd) as image:
+        assert contents(image, 'REN') == b'new' * 170
+        assert image.disk_info[0]['file_info'][0]['load_&'] == 0x3000
+
+
+def test_replace_over_old_file_when_full(ssd):
+    with acorn_dfs(ssd, writable=True) as image:
+        image.add_file(0, 'REN', b'old' * 170)
+        fill(image)
+        old_start = start_of(image, 'REN')
+        image.add_file(0, 'REN', b'new' * 170)
+        assert start_of(image, 'REN') == old_start
+    with acorn_dfs(ssd) as image:
+        assert contents(image, 'REN') == b'new' * 170
+        assert image.disk_info[0]['file_count'] == 2
+
+
+def test_locked_file_is_refused(ssd):
+    with acorn_dfs(ssd, writable=True) as image:
+        image.add_file(0, 'SAFE', b'keep', locked=True)
+        before = read(ssd)
+        index = image.find_file(0, 'SAFE')
+        with pytest.raises(DFSError, match="locked"):
+            image.add_file(0, 'SAFE', b'overwrite')
+        with pytest.raises(DFSError, match="locked"):
+            image.delete_file(0, index)
+        with pytest.raises(DFSError, match="locked"):
+            image.rename_file(0, index, 'OTHER')
+        image.image.flush()
+        assert read(ssd) == before
+        image.lock_file(0, index, False)
+        image.delete_file(0, index)
+        assert image.find_file(0, 'SAFE') is None
+
+
+def test_disk_full_leaves_image_unchanged(ssd):
+    with acorn_dfs(ssd, writable=True) as image:
+        image.add_file(0, 'OLD', b'x' * 100)
+        fill(image)
+        image.image.flush()
+        before = read(ssd)
+        with pytest.raises(DFSError, match="Disk full"):
+            image.add_file(0, 'NEW', b'y')
+        with pytest.raises(DFSError, match="Disk full"):
+            image.add_file(0, 'OLD', b'z' * 3 * 256)
+        assert contents(image, 'OLD') == b'x' * 100
+        image.image.flush()
+        assert read(ssd) == before
+
+
+def test_compact_keeps_contents(ssd):
+    rng = random.Random(2)
+    files = {f"F{index}": rng.randbytes(rng.randint(1, 2000)) for index in range(8)}
+    with acorn_dfs(ssd, writable=True) as image:
+        for name, data in files.items():
+            image.add_file(0, name, data)
+        for name in ('F1', 'F4', 'F6'):
+            image.delete_file(0, image.find_file(0, name))
+            del files[name]
+        assert image.compact(0)
+        assert not image.compact(0)  # Nothing left to move
+    with acorn_dfs(ssd) as image:
+        assert {name: contents(image, name) for name in files} == files
+        extents = sorted((info['start'], info['size']) for info in image.disk_info[0]['file_info'])
+        next_free = 2
+        for start, size in extents:
+            assert start == next_free
+            next_free += (size + 255) >> 8
+
+
+def test_dsd_side_write(tmp_path):
+    filename = str(tmp_path / 'TEST.dsd')
+    with open(filename, 'wb') as file_p:
+        file_p.write(make_dsd(random.Random(3), 2))
+    data = random.Random(4).randbytes(0x1800)  # Crosses several tracks
+    with acorn_dfs(filename) as image:
+        side0 = bytes(image.read_disk(0, 0, 0x32000))
+    with acorn_dfs(filename, writable=True) as image:
+        image.add_file(1, 'SIDE1', data)
+    with acorn_dfs(filename) as image:
+        assert bytes(image.read_disk(0, 0, 0x32000)) == side0
+        index = image.find_file(1, 'SIDE1')
+        assert bytes(image.get_data(1, index)[0]) == data
+        assert image.disk_info[1]['file_count'] == 3